@@ -23,9 +23,11 @@ Usage:
 
 import streamlit as st
 import pandas as pd
+from copy import copy
 from dataclasses import dataclass, field, asdict
 from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
+from functools import lru_cache
 import json
 
 
@@ -130,6 +132,7 @@ class SessionStateManager:
     DEFAULTS = {
         'patient_context': None,
         'search_results': None,
+        'results_page': 0,
         'show_pa_text': False,
         'show_moh_check': False,
         'current_page': 'Dashboard',
@@ -142,6 +145,13 @@ class SessionStateManager:
         # Legacy compatibility
         'parsed_data': {},
         'patient_age': None,  # Don't default - let user specify
+        # App gate, guided collection and email capture
+        'hipaa_acknowledged': False,
+        'data_collection_state': None,
+        'show_email_form': False,
+        'pa_text_for_email': None,
+        'pa_email_context': {},
+        'email_captures': [],
     }
     
     @classmethod
@@ -154,7 +164,8 @@ class SessionStateManager:
         """
         for key, default in cls.DEFAULTS.items():
             if key not in st.session_state:
-                st.session_state[key] = default
+                # Copy so sessions never share a mutable default ({} / [])
+                st.session_state[key] = copy(default)
         
         # Initialize patient context as PatientContext object
         if st.session_state.patient_context is None:
@@ -421,17 +432,15 @@ class SidebarHelper:
             return 0
         
         # Try exact match
-        for i, p in enumerate(payer_options):
-            if ctx.payer == p:
-                return i
+        if ctx.payer in payer_options:
+            return payer_options.index(ctx.payer)
         
         # Try fuzzy match
         payer_lower = ctx.payer.lower()
-        for i, p in enumerate(payer_options):
-            if payer_lower in p.lower() or p.lower() in payer_lower:
-                return i
-        
-        return 0
+        return next(
+            (i for i, p in enumerate(payer_options) if payer_lower in (p_lower := p.lower()) or p_lower in payer_lower),
+            0
+        )
     
     @staticmethod
     def get_drug_index(drug_options: List[str]) -> int:
@@ -459,8 +468,18 @@ class SidebarHelper:
 class PAGenerator:
     """
     Helper for generating prior authorization documentation.
+    
+    The text renderers are pure functions of hashable fields and are memoized
+    with functools.lru_cache, so reruns that leave the policy and patient
+    unchanged reuse the previous letter.
     """
     
+    DIAG_CODES = {
+        "Chronic Migraine": "G43.709",
+        "Episodic Migraine": "G43.909",
+        "Cluster Headache": "G44.009"
+    }
+    
     @staticmethod
     def generate(row: pd.Series, db_c: pd.DataFrame, mode: str = 'pcp') -> str:
         """
@@ -477,48 +496,72 @@ class PAGenerator:
         ctx = SessionStateManager.get_context()
         
         if mode == 'pcp':
-            return PAGenerator._generate_detailed(row, db_c, ctx)
+            render = PAGenerator._generate_detailed
+            step_req = row.get('Step_1_Requirement', row.get('Step_Therapy_Requirements', 'Per policy'))
+            step_dur = row.get('Step_1_Duration', row.get('Step_Therapy_Duration', 'Trial duration per policy'))
         else:
-            return PAGenerator._generate_compact(row, db_c, ctx)
+            render = PAGenerator._generate_compact
+            step_req = row.get('Step_1_Requirement', 'Prior preventive')
+            step_dur = row.get('Step_1_Duration', 'Per policy')
+        
+        prior_meds = tuple(
+            m.get('name', '') if isinstance(m, dict) else str(m)
+            for m in ctx.prior_medications or ()
+        )
+        
+        return render(
+            datetime.now().strftime('%Y-%m-%d'), row['Payer_Name'], ctx.state,
+            ctx.diagnosis, ctx.age, ctx.drug_class or row.get('Drug_Class', 'N/A'),
+            row['Medication_Category'], row['LOB'],
+            row.get('Step_Therapy_Required') == 'Yes', step_req, step_dur,
+            prior_meds, PAGenerator._denial_rationale(row, db_c)
+        )
+    
+    @staticmethod
+    def _denial_rationale(row: pd.Series, db_c: pd.DataFrame) -> Optional[str]:
+        """Winning clinical phrases for the row's denial code, if any."""
+        if pd.notna(row.get('Vault_Denial_Code')):
+            denial_info = db_c[db_c['Vault_Denial_Code'] == row['Vault_Denial_Code']]
+            if len(denial_info) > 0:
+                denial_row = denial_info.iloc[0]
+                if pd.notna(denial_row.get('Winning_Clinical_Phrases_Universal')):
+                    return denial_row['Winning_Clinical_Phrases_Universal']
+        return None
     
     @staticmethod
-    def _generate_detailed(row: pd.Series, db_c: pd.DataFrame, ctx: PatientContext) -> str:
+    @lru_cache(maxsize=128)
+    def _generate_detailed(date: str, payer: str, state: Optional[str], diagnosis: str,
+                           age: Optional[int], drug_class: str, category: str, lob: str,
+                           step_required: bool, step_req: str, step_dur: str,
+                           prior_meds: Tuple[str, ...], rationale: Optional[str]) -> str:
         """Generate detailed PA for PCP mode."""
         
         # Determine diagnosis code
-        diag_codes = {
-            "Chronic Migraine": "G43.709",
-            "Episodic Migraine": "G43.909", 
-            "Cluster Headache": "G44.009"
-        }
-        diag_code = diag_codes.get(ctx.diagnosis, "G43.909")
+        diag_code = PAGenerator.DIAG_CODES.get(diagnosis, "G43.909")
         
         pa_text = f"""
 ╔══════════════════════════════════════════════════════════════════╗
 ║                    PRIOR AUTHORIZATION REQUEST                    ║
 ╠══════════════════════════════════════════════════════════════════╣
-║  Date: {datetime.now().strftime('%Y-%m-%d')}
-║  Payer: {row['Payer_Name']}
-║  State: {ctx.state}
+║  Date: {date}
+║  Payer: {payer}
+║  State: {state}
 ╚══════════════════════════════════════════════════════════════════╝
 
 PATIENT INFORMATION
 ───────────────────
-  Diagnosis: {ctx.diagnosis} ({diag_code})
-  Age: {ctx.age} years
+  Diagnosis: {diagnosis} ({diag_code})
+  Age: {age} years
 
 REQUESTED MEDICATION
 ────────────────────
-  Drug Class: {ctx.drug_class or row.get('Drug_Class', 'N/A')}
-  Category: {row['Medication_Category']}
-  Line of Business: {row['LOB']}
+  Drug Class: {drug_class}
+  Category: {category}
+  Line of Business: {lob}
 """
         
         # Step therapy section
-        if row.get('Step_Therapy_Required') == 'Yes':
-            step_req = row.get('Step_1_Requirement', row.get('Step_Therapy_Requirements', 'Per policy'))
-            step_dur = row.get('Step_1_Duration', row.get('Step_Therapy_Duration', 'Trial duration per policy'))
-            
+        if step_required:
             pa_text += f"""
 STEP THERAPY REQUIREMENTS
 ─────────────────────────
@@ -527,8 +570,8 @@ STEP THERAPY REQUIREMENTS
   Duration: {step_dur}
 """
             # Add prior medications if available
-            if ctx.prior_medications:
-                pa_text += f"  Prior Therapies: {', '.join(ctx.prior_medications)}\n"
+            if prior_meds:
+                pa_text += f"  Prior Therapies: {', '.join(prior_meds)}\n"
                 pa_text += "  Documentation: Completed with documented failure ✓\n"
         else:
             pa_text += """
@@ -538,15 +581,11 @@ STEP THERAPY REQUIREMENTS
 """
         
         # Clinical rationale from denial codes
-        if pd.notna(row.get('Vault_Denial_Code')):
-            denial_info = db_c[db_c['Vault_Denial_Code'] == row['Vault_Denial_Code']]
-            if len(denial_info) > 0:
-                denial_row = denial_info.iloc[0]
-                if pd.notna(denial_row.get('Winning_Clinical_Phrases_Universal')):
-                    pa_text += f"""
+        if rationale:
+            pa_text += f"""
 CLINICAL RATIONALE
 ──────────────────
-{denial_row['Winning_Clinical_Phrases_Universal']}
+{rationale}
 """
         
         pa_text += """
@@ -560,27 +599,24 @@ REFERENCES
         return pa_text
     
     @staticmethod
-    def _generate_compact(row: pd.Series, db_c: pd.DataFrame, ctx: PatientContext) -> str:
+    @lru_cache(maxsize=128)
+    def _generate_compact(date: str, payer: str, state: Optional[str], diagnosis: str,
+                          age: Optional[int], drug_class: str, category: str, lob: str,
+                          step_required: bool, step_req: str, step_dur: str,
+                          prior_meds: Tuple[str, ...], rationale: Optional[str]) -> str:
         """Generate compact PA for specialist mode."""
         
-        diag_codes = {
-            "Chronic Migraine": "G43.709",
-            "Episodic Migraine": "G43.909",
-            "Cluster Headache": "G44.009"
-        }
-        diag_code = diag_codes.get(ctx.diagnosis, "G43.909")
+        diag_code = PAGenerator.DIAG_CODES.get(diagnosis, "G43.909")
         
-        pa_text = f"""{datetime.now().strftime('%Y-%m-%d')} | {row['Payer_Name']} | {ctx.state}
+        pa_text = f"""{date} | {payer} | {state}
 
-Dx: {ctx.diagnosis} ({diag_code})
-Age: {ctx.age}y
-Rx: {ctx.drug_class or row.get('Drug_Class', 'N/A')} ({row['Medication_Category']})
-LOB: {row['LOB']}
+Dx: {diagnosis} ({diag_code})
+Age: {age}y
+Rx: {drug_class} ({category})
+LOB: {lob}
 """
         
-        if row.get('Step_Therapy_Required') == 'Yes':
-            step_req = row.get('Step_1_Requirement', 'Prior preventive')
-            step_dur = row.get('Step_1_Duration', 'Per policy')
+        if step_required:
             pa_text += f"""
 Step Therapy: REQUIRED
   - {step_req}
@@ -591,12 +627,8 @@ Step Therapy: REQUIRED
             pa_text += "\nStep Therapy: Not required\n"
         
         # Add denial code rationale
-        if pd.notna(row.get('Vault_Denial_Code')):
-            denial_info = db_c[db_c['Vault_Denial_Code'] == row['Vault_Denial_Code']]
-            if len(denial_info) > 0:
-                denial_row = denial_info.iloc[0]
-                if pd.notna(denial_row.get('Winning_Clinical_Phrases_Universal')):
-                    pa_text += f"\nClinical Rationale:\n{denial_row['Winning_Clinical_Phrases_Universal']}\n"
+        if rationale:
+            pa_text += f"\nClinical Rationale:\n{rationale}\n"
         
         pa_text += "\nRefs: AHS 2024, ICHD-3, AAN Guidelines"
         
@@ -1,13 +1,23 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import bisect
+import hashlib
 import json
+import math
 import re
 import requests
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from operator import itemgetter
+from requests.adapters import HTTPAdapter
 from data_flow import SessionStateManager, SidebarHelper, SearchService, PAGenerator
 from enum import Enum
 from dataclasses import dataclass, field
-from typing import Optional, List, Tuple
+from typing import Dict, Final, NamedTuple, Optional, List, Tuple
 
 # ============================================================================
 # EMAIL INTEGRATION - Resend API for PA delivery and lead capture
@@ -146,7 +156,7 @@ def send_pa_email(recipient_email: str, pa_text: str, patient_info: dict, notify
 
 def show_email_modal():
     """Display email capture modal in sidebar or expander."""
-    if 'pa_text_for_email' not in st.session_state or not st.session_state.pa_text_for_email:
+    if not st.session_state.pa_text_for_email:
         return
     
     with st.expander("📧 Email this PA to yourself", expanded=st.session_state.get('show_email_form', False)):
@@ -188,8 +198,6 @@ def show_email_modal():
                         st.success(f"✅ {message}")
                         st.session_state.show_email_form = False
                         # Track successful capture
-                        if 'email_captures' not in st.session_state:
-                            st.session_state.email_captures = []
                         st.session_state.email_captures.append({
                             'email': email_input,
                             'notify_launch': notify_launch,
@@ -970,53 +978,66 @@ class FieldPriority(Enum):
     IMPORTANT = "important"    # Strongly recommended (payer, drug)
     HELPFUL = "helpful"        # Nice to have (diagnosis, age)
 
-@dataclass
-class DataCollectionState:
-    """Tracks what data has been collected and what's missing."""
+# (field, search-quality weight) for each collected field, in display order
+_COLLECTION_FIELDS = (
+    ('state', 40), ('payer', 30), ('drug_class', 20),
+    ('diagnosis', 4), ('age', 3), ('prior_medications', 3),
+)
+# Interned field names; order matches DataCollectionState's fields so they zip with it
+_FIELD_NAMES: Final[Tuple[str, ...]] = tuple(sys.intern(name) for name, _ in _COLLECTION_FIELDS)
+# Shared return values for get_missing_required_fields (state is the only required field)
+_MISSING_STATE: Final[Tuple[str, ...]] = (_FIELD_NAMES[0],)
+_NONE_MISSING: Final[Tuple[str, ...]] = ()
+
+# Weight of each presence bit (bit i = _COLLECTION_FIELDS[i]) for batch scoring
+_COLLECTION_WEIGHTS = np.array([weight for _, weight in _COLLECTION_FIELDS], dtype=np.int32)
+_COLLECTION_BITS = np.arange(len(_COLLECTION_FIELDS), dtype=np.uint8)
+
+def score_batch(masks: np.ndarray) -> np.ndarray:
+    """Search-quality scores for an array of DataCollectionState.presence_mask() values."""
+    present = (masks.astype(np.uint8)[:, None] >> _COLLECTION_BITS) & 1
+    return present @ _COLLECTION_WEIGHTS
+
+# Search-quality score thresholds (ascending) and their labels
+_QUALITY_THRESHOLDS = (0, 40, 50, 70, 90)
+_QUALITY_DESCRIPTIONS = (
+    "Insufficient - State required",
+    "Limited - State-level search only",
+    "Fair - Broad search, may have many results",
+    "Good - Well-targeted search",
+    "Excellent - Highly targeted search",
+)
+# Label for every reachable score (0..sum of weights), so scoring is a single index
+_QUALITY_LABELS = tuple(
+    _QUALITY_DESCRIPTIONS[bisect.bisect_right(_QUALITY_THRESHOLDS, score) - 1]
+    for score in range(sum(weight for _, weight in _COLLECTION_FIELDS) + 1)
+)
+
+class DataCollectionState(NamedTuple):
+    """Tracks what data has been collected and what's missing (immutable; rebuilt per parse)."""
     state: Optional[str] = None
     payer: Optional[str] = None
     drug_class: Optional[str] = None
     diagnosis: Optional[str] = None
     age: Optional[str] = None
-    prior_medications: List[str] = field(default_factory=list)
+    prior_medications: Tuple = ()
     
     def get_collected_fields(self) -> List[str]:
-        collected = []
-        if self.state: collected.append('state')
-        if self.payer: collected.append('payer')
-        if self.drug_class: collected.append('drug_class')
-        if self.diagnosis: collected.append('diagnosis')
-        if self.age: collected.append('age')
-        if self.prior_medications: collected.append('prior_medications')
-        return collected
-    
-    def get_missing_required_fields(self) -> List[str]:
-        missing = []
-        if not self.state: missing.append('state')
-        return missing
+        return [name for name, val in zip(_FIELD_NAMES, self) if val]
+    
+    def presence_mask(self) -> int:
+        """Collected fields packed as bits in _COLLECTION_FIELDS order (input to score_batch)."""
+        return sum(1 << i for i, (name, _) in enumerate(_COLLECTION_FIELDS) if getattr(self, name))
+    
+    def get_missing_required_fields(self) -> Tuple[str, ...]:
+        return _NONE_MISSING if self.state else _MISSING_STATE
     
     def can_proceed_to_search(self) -> bool:
         return self.state is not None
     
     def get_search_quality_score(self) -> Tuple[int, str]:
-        score = 0
-        if self.state: score += 40
-        if self.payer: score += 30
-        if self.drug_class: score += 20
-        if self.diagnosis: score += 4
-        if self.age: score += 3
-        if self.prior_medications: score += 3
-        
-        if score >= 90:
-            return score, "Excellent - Highly targeted search"
-        elif score >= 70:
-            return score, "Good - Well-targeted search"
-        elif score >= 50:
-            return score, "Fair - Broad search, may have many results"
-        elif score >= 40:
-            return score, "Limited - State-level search only"
-        else:
-            return score, "Insufficient - State required"
+        score = sum(weight for name, weight in _COLLECTION_FIELDS if getattr(self, name))
+        return score, _QUALITY_LABELS[score]
 
 # ============================================================================
 # MEDICATION TRIAL TRACKING & GAP ANALYSIS
@@ -1081,13 +1102,10 @@ class GapAnalysis:
     
     def analyze(self) -> dict:
         """Perform gap analysis and return structured results."""
-        results = {
-            'ready_for_pa': False,
-            'medication_gaps': [],
-            'documentation_gaps': [],
-            'recommendations': [],
-            'completeness_score': 0
-        }
+        medication_gaps = []
+        documentation_gaps = []
+        recommendations = []
+        completeness_score = 0
         
         # Determine how many medication classes are required
         step_req = self.policy_requirements.get('Step_1_Requirement', '').lower()
@@ -1106,7 +1124,7 @@ class GapAnalysis:
                 completeness, missing = med.calculate_completeness()
                 
                 if missing:
-                    results['medication_gaps'].append({
+                    medication_gaps.append({
                         'medication': med.medication_name,
                         'class': med.drug_class,
                         'missing': missing,
@@ -1119,16 +1137,16 @@ class GapAnalysis:
         
         # Check if we have enough classes
         if self.classes_documented < self.required_med_classes:
-            results['documentation_gaps'].append(
+            documentation_gaps.append(
                 f"Need {self.required_med_classes} medication classes, only {self.classes_documented} documented"
             )
-            results['recommendations'].append(
+            recommendations.append(
                 f"Document {self.required_med_classes - self.classes_documented} more failed medication(s)"
             )
         
         # Check completeness of documented medications
-        if results['medication_gaps']:
-            results['recommendations'].append(
+        if medication_gaps:
+            recommendations.append(
                 "Complete missing details (dose, duration, reason stopped) for documented medications"
             )
         
@@ -1136,15 +1154,16 @@ class GapAnalysis:
         if self.required_med_classes > 0:
             class_score = min(100, (self.classes_documented / self.required_med_classes) * 50)
             detail_score = (self.classes_with_complete_details / max(1, self.classes_documented)) * 50
-            results['completeness_score'] = int(class_score + detail_score)
-        
-        # Determine if ready for PA
-        results['ready_for_pa'] = (
-            self.classes_documented >= self.required_med_classes and
-            len(results['medication_gaps']) == 0
-        )
+            completeness_score = int(class_score + detail_score)
         
-        return results
+        return {
+            # Ready for PA once enough classes are documented with complete details
+            'ready_for_pa': self.classes_documented >= self.required_med_classes and not medication_gaps,
+            'medication_gaps': medication_gaps,
+            'documentation_gaps': documentation_gaps,
+            'recommendations': recommendations,
+            'completeness_score': completeness_score
+        }
 
 
 # Therapeutic dose reference data (from Therapeutic_Doses.csv)
@@ -1261,15 +1280,22 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Force light theme
-st.markdown("""
+# Force light theme (emitted together with the brand CSS below)
+_FORCE_LIGHT_THEME_JS = """
 <script>
     window.parent.document.documentElement.setAttribute('data-theme', 'light');
 </script>
-""", unsafe_allow_html=True)
+"""
 
-# Custom CSS with Headache Vault brand identity
-st.markdown("""
+def _minify_css(css: str) -> str:
+    """Strip comments and collapse whitespace in a CSS/<style> block."""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{}:;,])\s*', r'\1', css)
+    return css.strip()
+
+# Custom CSS with Headache Vault brand identity (minified once when the script runs)
+_BRAND_CSS = _minify_css("""
 <style>
     /* Import brand fonts */
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;700&family=Source+Sans+Pro:wght@400;600&display=swap');
@@ -1316,22 +1342,6 @@ st.markdown("""
         margin: 1rem 0;
         color: #262730;
     }
-    .warning-box {
-        background-color: #FFF9E6;  /* Lighter yellow for warnings */
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #FFD700;  /* Gold Card Yellow */
-        margin: 1rem 0;
-        color: #856404;
-    }
-    .success-box {
-        background-color: #F5F0FF;  /* Lavender tint */
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #FFD700;  /* Gold Card Yellow for Gold Card status */
-        margin: 1rem 0;
-        color: #262730;  /* Dark text for readability */
-    }
     .evidence-tag {
         display: inline-block;
         background-color: #E6E6FA;  /* Compassion Lavender */
@@ -1999,10 +2009,14 @@ st.markdown("""
     margin: 1rem 0;
 }
 </style>
-""", unsafe_allow_html=True)
+""")
+
+# Re-emitted every run: Streamlit drops elements a rerun does not render.
+# Theme script and stylesheet go out as one element instead of two.
+st.markdown(_FORCE_LIGHT_THEME_JS + _BRAND_CSS, unsafe_allow_html=True)
 
 # Load databases
-@st.cache_data
+@st.cache_resource
 def load_databases():
     """
     Load all Headache Vault databases from CSV files.
@@ -2017,19 +2031,84 @@ def load_databases():
     - icd10_codes: 47 diagnosis codes with ICHD-3 mappings
     - therapeutic_doses: 41 medications with ACP 2025 thresholds
     - otc_medications: 29 OTC meds for MOH tracking
+    
+    Cached as a shared resource (no per-rerun pickle/hash of the frames), so the
+    returned DataFrames must be treated as read-only: filter, then .copy() before
+    adding or changing columns.
     """
-    payer_registry = pd.read_csv('Payer_Registry.csv')
-    payer_policies = pd.read_csv('Payer_Policies.csv')
-    denial_codes = pd.read_csv('Denial_Codes_Appeals.csv')
-    pediatric_overrides = pd.read_csv('Pediatric_Overrides.csv')
-    state_regulations = pd.read_csv('State_Regulations.csv')
-    icd10_codes = pd.read_csv('ICD10_Diagnosis_Codes.csv')
-    therapeutic_doses = pd.read_csv('Therapeutic_Doses.csv')
-    otc_medications = pd.read_csv('OTC_Medications.csv')
+    # Arrow-backed strings for the hot lookup columns (faster unique/compare, less memory)
+    arrow_str = 'string[pyarrow]'
+    csv_specs = {
+        'payer_registry': ('Payer_Registry.csv', {
+            'State': arrow_str,
+            'Payer_Name': arrow_str,
+            'LOB': 'category',
+            'LOB_Code': 'category',
+            'Vault_Payer_ID': arrow_str
+        }),
+        # Low-cardinality filter columns as categoricals (equality masks become integer compares)
+        'payer_policies': ('Payer_Policies.csv', {
+            'State': 'category',
+            'Payer_Name': arrow_str,
+            'LOB': 'category',
+            'Drug_Class': 'category',
+            'Medication_Category': 'category',
+            'Step_Therapy_Required': 'category'
+        }),
+        # Largest table (~6.5k rows); lookups filter on Vault_Payer_ID + Drug_Class
+        'formulary_tier_map': ('Formulary_Tier_Map.csv', {
+            'Vault_Payer_ID': arrow_str,
+            'State': 'category',
+            'Payer_Name': arrow_str,
+            'Drug_Name': arrow_str,
+            'Drug_Class': 'category'
+            # Formulary_Status stays object: 250 blank rows must load as NaN, not pd.NA
+        }),
+        'denial_codes': ('Denial_Codes_Appeals.csv', None),
+        'pediatric_overrides': ('Pediatric_Overrides.csv', None),
+        'state_regulations': ('State_Regulations.csv', None),
+        'icd10_codes': ('ICD10_Diagnosis_Codes.csv', None),
+        'therapeutic_doses': ('Therapeutic_Doses.csv', None),
+        'otc_medications': ('OTC_Medications.csv', None),
+    }
+    # The C parser releases the GIL, so the independent files parse concurrently
+    with ThreadPoolExecutor(max_workers=len(csv_specs)) as executor:
+        futures = {name: executor.submit(pd.read_csv, path, dtype=dtype)
+                   for name, (path, dtype) in csv_specs.items()}
+    
+    payer_registry = futures['payer_registry'].result()
+    payer_policies = futures['payer_policies'].result()
+    # Precomputed headache-type flags used by the search filters
+    payer_policies['Is_Cluster'] = payer_policies['Drug_Class'].str.contains('Cluster', case=False, na=False)
+    payer_policies['Is_Chronic'] = payer_policies['Medication_Category'].str.contains('Chronic|Preventive', case=False, na=False)
+    # Case-folded once so payer keyword matching can run case-sensitive substring scans
+    payer_policies['Payer_Name_lc'] = payer_policies['Payer_Name'].str.lower()
+    # Older DB exports used Step_Therapy_* names; fold them into the Step_1_* columns
+    for canonical, legacy in (('Step_1_Requirement', 'Step_Therapy_Requirements'),
+                              ('Step_1_Duration', 'Step_Therapy_Duration')):
+        if legacy in payer_policies.columns:
+            legacy_col = payer_policies.pop(legacy)
+            payer_policies[canonical] = (payer_policies[canonical].fillna(legacy_col)
+                                         if canonical in payer_policies.columns else legacy_col)
+    # Display text with defaults filled once, then pre-split into per-step lists for the result cards
+    payer_policies['Step_Requirement'] = payer_policies['Step_1_Requirement'].fillna('').astype(str).replace('', 'Not specified')
+    payer_policies['Step_Duration'] = payer_policies['Step_1_Duration'].fillna('').astype(str).replace('', 'Trial duration not specified')
+    payer_policies['Step_Therapies'] = payer_policies['Step_Requirement'].str.split(';')
+    payer_policies['Step_Durations'] = payer_policies['Step_Duration'].str.split(';')
+    denial_codes = futures['denial_codes'].result()
+    pediatric_overrides = futures['pediatric_overrides'].result()
+    state_regulations = futures['state_regulations'].result()
+    icd10_codes = futures['icd10_codes'].result()
+    # Precomputed code-family masks for the ICD-10 lookup tool
+    icd10_codes['Is_Cluster'] = icd10_codes['ICD10_Code'].str.startswith('G44.0', na=False)
+    icd10_codes['Is_Chronic_Migraine'] = icd10_codes['ICD10_Code'].str.contains('G43.7', regex=False, na=False)
+    icd10_codes['Is_Migraine'] = icd10_codes['ICD10_Code'].str.startswith('G43', na=False)
+    therapeutic_doses = futures['therapeutic_doses'].result()
+    otc_medications = futures['otc_medications'].result()
     
     # Formulary Tier Map — drug-level coverage details per payer (v3.0)
     try:
-        formulary_tier_map = pd.read_csv('Formulary_Tier_Map.csv')
+        formulary_tier_map = futures['formulary_tier_map'].result()
     except FileNotFoundError:
         formulary_tier_map = pd.DataFrame(columns=[
             'Vault_Payer_ID', 'State', 'Payer_Name', 'Drug_Name', 'Drug_Class',
@@ -2039,52 +2118,98 @@ def load_databases():
     
     return payer_registry, payer_policies, formulary_tier_map, denial_codes, pediatric_overrides, state_regulations, icd10_codes, therapeutic_doses, otc_medications
 
+@dataclass(slots=True, frozen=True)
+class VaultDB:
+    """Loaded databases plus lookup indexes derived from them."""
+    payer_registry: pd.DataFrame
+    payer_policies: pd.DataFrame
+    formulary_tier_map: pd.DataFrame
+    denial_codes: pd.DataFrame
+    pediatric_overrides: pd.DataFrame
+    state_regulations: pd.DataFrame
+    icd10_codes: pd.DataFrame
+    therapeutic_doses: pd.DataFrame
+    otc_medications: pd.DataFrame
+    formulary_by_payer_id: Dict[str, pd.DataFrame]
+
+@st.cache_resource
+def build_vault_db(_tables) -> VaultDB:
+    """Wrap load_databases() output in a VaultDB and build its indexes once per process."""
+    formulary_tier_map = _tables[2]
+    formulary_by_payer_id = {
+        payer_id: group for payer_id, group in formulary_tier_map.groupby('Vault_Payer_ID', sort=False)
+    }
+    return VaultDB(*_tables, formulary_by_payer_id=formulary_by_payer_id)
+
+@st.cache_resource
+def build_state_index(_db_b):
+    """Split payer policies into one DataFrame per state, built once per process."""
+    return {state: group.reset_index(drop=True) for state, group in _db_b.groupby('State', sort=False, observed=True)}
+
+@st.cache_resource
+def build_otc_moh_view(_otc):
+    """Columns shown in the MOH checker's OTC reference table, projected once per process."""
+    return _otc[['Medication_Name', 'MOH_Category', 'MOH_Threshold_Days_Per_Month', 'Caffeine_Content_mg']]
+
 # ============================================================================
-# HELPER: Get step therapy details with column name fallback
+# HELPER: Get step therapy details
 # ============================================================================
+def _clean(val, default=''):
+    """Return val as a string, or default if it is missing/NaN."""
+    if val is None or (isinstance(val, float) and math.isnan(val)):
+        return default
+    return str(val)
+
+
 def get_step_therapy_details(row):
-    """Get step therapy details with column name fallback for DB compatibility."""
-    requirement = row.get('Step_1_Requirement') or row.get('Step_Therapy_Requirements') or 'Not specified'
-    duration = row.get('Step_1_Duration') or row.get('Step_Therapy_Duration') or 'Trial duration not specified'
-    return str(requirement), str(duration)
+    """Get step therapy requirement/duration text (column names and defaults normalized at load)."""
+    return row['Step_Requirement'], row['Step_Duration']
 
 # ============================================================================
 # GUIDED DATA COLLECTION HELPERS
 # ============================================================================
 
+# Scalar fields pulled from a parsed note, in DataCollectionState order
+_PARSED_FIELDS = ('state', 'payer', 'drug_class', 'diagnosis', 'age')
+_get_parsed_fields = itemgetter(*_PARSED_FIELDS)
+_PARSED_DEFAULTS = dict.fromkeys(_PARSED_FIELDS)
+
 def analyze_parsed_data(parsed_data: dict) -> DataCollectionState:
     """Convert parsed AI data into a DataCollectionState."""
     return DataCollectionState(
-        state=parsed_data.get('state'),
-        payer=parsed_data.get('payer'),
-        drug_class=parsed_data.get('drug_class'),
-        diagnosis=parsed_data.get('diagnosis'),
-        age=parsed_data.get('age'),
-        prior_medications=parsed_data.get('prior_medications', [])
+        *_get_parsed_fields({**_PARSED_DEFAULTS, **parsed_data}),
+        prior_medications=tuple(parsed_data.get('prior_medications') or ())
     )
 
-def get_quality_indicator_html(score: int, description: str) -> str:
-    """Generate HTML for quality indicator badge."""
-    if score >= 90:
-        color_class = "quality-excellent"
-        icon = "🎯"
-    elif score >= 70:
-        color_class = "quality-good"
-        icon = "✅"
-    elif score >= 50:
-        color_class = "quality-fair"
-        icon = "⚠️"
-    else:
-        color_class = "quality-limited"
-        icon = "📊"
-    
-    return f'''
+# Quality badge (min score, CSS class, icon), highest threshold first
+_QUALITY_BADGES = (
+    (90, 'quality-excellent', '🎯'),
+    (70, 'quality-good', '✅'),
+    (50, 'quality-fair', '⚠️'),
+    (0, 'quality-limited', '📊'),
+)
+
+_QUALITY_BADGE_TMPL = '''
     <div class="{color_class}" style="padding: 0.75rem 1rem; border-radius: 8px; margin: 1rem 0; display: inline-block;">
         <span style="font-size: 1.1rem;">{icon}</span>
         <strong>Search Quality: {score}%</strong> — {description}
     </div>
     '''
 
+def _quality_bucket(score: int) -> int:
+    """Index into _QUALITY_BADGES for a score."""
+    return next(i for i, (threshold, _, _) in enumerate(_QUALITY_BADGES) if score >= threshold)
+
+@lru_cache(maxsize=64)
+def _render_quality_badge(bucket: int, description: str, score: int) -> str:
+    """Badge HTML, memoized: scores and descriptions come from small fixed sets."""
+    _, color_class, icon = _QUALITY_BADGES[bucket]
+    return _QUALITY_BADGE_TMPL.format(color_class=color_class, icon=icon, score=score, description=description)
+
+def get_quality_indicator_html(score: int, description: str) -> str:
+    """Generate HTML for quality indicator badge."""
+    return _render_quality_badge(_quality_bucket(score), description, score)
+
 def render_gap_analysis_ui(policy_row: dict, medication_trials: List[MedicationTrial], unique_key: str) -> Tuple[bool, List[MedicationTrial]]:
     """
     Render the gap analysis UI for a specific policy.
@@ -2462,6 +2587,69 @@ Thank you for your consultation.""", language=None)
 # ============================================================================
 # NATIONAL FALLBACK SEARCH - Added Jan 2026
 # ============================================================================
+@st.cache_resource
+def build_policy_index(_db_b):
+    """Index payer policies by (State, Drug_Class) for exact lookups, built once per process."""
+    return _db_b.set_index(['State', 'Drug_Class'], drop=False).sort_index()
+
+def policies_for_state(db_b, state):
+    """All policies for one state (or 'ALL') from the per-state index; empty frame if none."""
+    return build_state_index(db_b).get(state, db_b.iloc[0:0])
+
+@st.cache_resource
+def build_state_payer_names(_db_b):
+    """Lowercased payer names per state as str arrays, row-aligned with build_state_index frames."""
+    return {state: frame['Payer_Name_lc'].fillna('').to_numpy(dtype=str)
+            for state, frame in build_state_index(_db_b).items()}
+
+def payer_names_for_state(db_b, state):
+    """Lowercased payer-name array matching policies_for_state(db_b, state)."""
+    return build_state_payer_names(db_b).get(state, np.empty(0, dtype=str))
+
+def payer_keyword_mask(names_lc, keywords):
+    """Boolean mask of names containing any of the (lowercase) keywords."""
+    mask = np.zeros(len(names_lc), dtype=bool)
+    for kw in keywords:
+        mask |= np.char.find(names_lc, kw) >= 0
+    return mask
+
+def lookup_policies(db_b, state, drug_class):
+    """All policies for a state + drug class via the (State, Drug_Class) index."""
+    try:
+        return build_policy_index(db_b).loc[[(state, drug_class)]].reset_index(drop=True)
+    except KeyError:
+        return db_b.iloc[0:0]
+
+# Trigger substring in the user's payer text -> Payer_Name keywords to match.
+# Checked in insertion order; the first trigger found wins.
+_UNITED = ('united', 'uhc')
+_ANTHEM = ('anthem', 'elevance')
+_BCBS = ('bcbs', 'blue cross', 'blue shield')
+_POINT32 = ('harvard', 'pilgrim', 'point32', 'tufts')
+PAYER_KEYWORD_MAP = {
+    'horizon': ('horizon',),
+    'aetna': ('aetna',),
+    'united': _UNITED, 'uhc': _UNITED,
+    'cigna': ('cigna',),
+    'anthem': _ANTHEM, 'elevance': _ANTHEM,
+    'bcbs': _BCBS, 'blue cross': _BCBS,
+    'humana': ('humana',),
+    'kaiser': ('kaiser',),
+    'highmark': ('highmark',),
+    'independence': ('independence',),
+    'harvard': _POINT32, 'pilgrim': _POINT32, 'point32': _POINT32, 'tufts': _POINT32,
+}
+
+def payer_match_keywords(payer):
+    """Lowercase Payer_Name keywords for a user-entered payer (first word if no known payer)."""
+    payer_lower = payer.lower()
+    words = payer_lower.split()
+    # Unknown payer: use first significant word as keyword
+    return next(
+        (keywords for trigger, keywords in PAYER_KEYWORD_MAP.items() if trigger in payer_lower),
+        (words[0] if words else payer_lower,),
+    )
+
 def search_policies_with_fallback(db_b, state, payer=None, drug_class=None):
     """
     Search for policies with automatic fallback to national (ALL) entries
@@ -2476,59 +2664,27 @@ def search_policies_with_fallback(db_b, state, payer=None, drug_class=None):
     """
     fallback_used = False
     fallback_message = ""
+    payer_keywords = None
     
     # Step 1: Try state-specific search
-    query = db_b[db_b['State'] == state].copy()
-    query = query.reset_index(drop=True)  # Reset index to avoid boolean mask issues
+    # Shared per-state frame (already 0..n-1 indexed); masks below select with .iloc, so no copy
+    query = policies_for_state(db_b, state)
     
     # Apply payer filter with flexible matching
     if payer:
         # Extract key payer identifier for flexible matching
-        payer_lower = payer.lower()
-        
-        # Try to extract the core payer name for better matching
-        payer_keywords = []
-        if 'horizon' in payer_lower:
-            payer_keywords = ['horizon']
-        elif 'aetna' in payer_lower:
-            payer_keywords = ['aetna']
-        elif 'united' in payer_lower or 'uhc' in payer_lower:
-            payer_keywords = ['united', 'uhc']
-        elif 'cigna' in payer_lower:
-            payer_keywords = ['cigna']
-        elif 'anthem' in payer_lower or 'elevance' in payer_lower:
-            payer_keywords = ['anthem', 'elevance']
-        elif 'bcbs' in payer_lower or 'blue cross' in payer_lower:
-            payer_keywords = ['bcbs', 'blue cross', 'blue shield']
-        elif 'humana' in payer_lower:
-            payer_keywords = ['humana']
-        elif 'kaiser' in payer_lower:
-            payer_keywords = ['kaiser']
-        elif 'highmark' in payer_lower:
-            payer_keywords = ['highmark']
-        elif 'independence' in payer_lower:
-            payer_keywords = ['independence']
-        elif 'harvard' in payer_lower or 'pilgrim' in payer_lower or 'point32' in payer_lower or 'tufts' in payer_lower:
-            payer_keywords = ['harvard', 'pilgrim', 'point32', 'tufts']
-        else:
-            # Use first significant word as keyword
-            payer_keywords = [payer.split()[0].lower()] if payer.split() else [payer_lower]
+        payer_keywords = payer_match_keywords(payer)
         
         # Build flexible payer match
-        payer_mask = pd.Series([False] * len(query))
-        for kw in payer_keywords:
-            payer_mask = payer_mask | query['Payer_Name'].str.contains(kw, case=False, na=False)
+        payer_mask = payer_keyword_mask(payer_names_for_state(db_b, state), payer_keywords)
         
-        payer_query = query[payer_mask]
+        payer_query = query.iloc[payer_mask]
         
         # If no state match, try national fallback
         if len(payer_query) == 0:
-            national_query = db_b[db_b['State'] == 'ALL'].copy()
-            national_query = national_query.reset_index(drop=True)  # Reset index
-            national_mask = pd.Series([False] * len(national_query))
-            for kw in payer_keywords:
-                national_mask = national_mask | national_query['Payer_Name'].str.contains(kw, case=False, na=False)
-            national_payer = national_query[national_mask]
+            national_query = policies_for_state(db_b, 'ALL')
+            national_mask = payer_keyword_mask(payer_names_for_state(db_b, 'ALL'), payer_keywords)
+            national_payer = national_query.iloc[national_mask]
             
             if len(national_payer) > 0:
                 query = national_payer
@@ -2574,14 +2730,11 @@ def search_policies_with_fallback(db_b, state, payer=None, drug_class=None):
             
             # If still no results, try national fallback
             if len(drug_query) == 0 and not fallback_used:
-                national_query = db_b[db_b['State'] == 'ALL'].copy()
-                national_query = national_query.reset_index(drop=True)  # Reset index
-                if payer and 'payer_keywords' in dir():
+                national_query = policies_for_state(db_b, 'ALL')
+                if payer_keywords:
                     # Use same flexible matching
-                    national_mask = pd.Series([False] * len(national_query))
-                    for kw in payer_keywords:
-                        national_mask = national_mask | national_query['Payer_Name'].str.contains(kw, case=False, na=False)
-                    national_query = national_query[national_mask]
+                    national_mask = payer_keyword_mask(payer_names_for_state(db_b, 'ALL'), payer_keywords)
+                    national_query = national_query.iloc[national_mask]
                 
                 # Try original drug class nationally
                 national_drug = national_query[national_query['Drug_Class'] == drug_class]
@@ -2603,18 +2756,14 @@ def search_policies_with_fallback(db_b, state, payer=None, drug_class=None):
         # Final fallback: if payer-specific search returned nothing,
         # show all policies for this state + drug class (ignoring payer)
         if len(drug_query) == 0 and payer:
-            state_all_payers = db_b[db_b['State'] == state].copy()
-            if drug_class:
-                state_all_payers = state_all_payers[state_all_payers['Drug_Class'] == drug_class]
+            state_all_payers = lookup_policies(db_b, state, drug_class)
             if len(state_all_payers) > 0:
                 drug_query = state_all_payers
                 fallback_used = True
                 fallback_message = f"ℹ️ No specific {payer} {drug_class} policy found. Showing **all {state} payer policies** for this drug class. Verify requirements with {payer} directly."
             else:
                 # Try national all-payers
-                national_all = db_b[db_b['State'] == 'ALL'].copy()
-                if drug_class:
-                    national_all = national_all[national_all['Drug_Class'] == drug_class]
+                national_all = lookup_policies(db_b, 'ALL', drug_class)
                 if len(national_all) > 0:
                     drug_query = national_all
                     fallback_used = True
@@ -2625,6 +2774,23 @@ def search_policies_with_fallback(db_b, state, payer=None, drug_class=None):
     return query, fallback_used, fallback_message
 
 
+@st.cache_data(show_spinner=False)
+def run_policy_search(_db_b, state, payer, drug_class, headache_type=None, keep_if_empty=False):
+    """Policy search + headache-type filter shared by the Search and AI Parser buttons."""
+    query, fallback_used, fallback_message = search_policies_with_fallback(
+        _db_b, state=state, payer=payer, drug_class=drug_class
+    )
+    if headache_type == "Cluster Headache":
+        filtered = query[query['Is_Cluster']]
+    elif headache_type == "Chronic Migraine":
+        filtered = query[query['Is_Chronic']]
+    else:
+        filtered = query
+    if keep_if_empty and filtered.empty:
+        filtered = query
+    return filtered, fallback_used, fallback_message
+
+
 # ============================================================================
 # FORMULARY TIER MAP — Helper Functions (v3.0)
 # ============================================================================
@@ -2655,18 +2821,17 @@ def extract_selected_drug_name(parsed_data: dict) -> str:
                     return canonical
     return ""
 
-def lookup_formulary_for_policy(formulary_df, vault_payer_id: str, drug_class: str):
+@st.cache_data(show_spinner=False)
+def lookup_formulary_for_policy(_formulary_by_payer, vault_payer_id: str, drug_class: str):
     """
     Look up formulary tier data for a specific payer + drug class.
     Returns a DataFrame of drugs with their formulary status, sorted Preferred-first.
+    Cached per (payer, drug class); the formulary table is static for the app's lifetime.
     """
-    if formulary_df is None or formulary_df.empty:
+    payer_rows = _formulary_by_payer.get(vault_payer_id) if _formulary_by_payer else None
+    if payer_rows is None:
         return pd.DataFrame()
-    mask = (
-        (formulary_df['Vault_Payer_ID'] == vault_payer_id) &
-        (formulary_df['Drug_Class'] == drug_class)
-    )
-    tier_data = formulary_df[mask].copy()
+    tier_data = payer_rows[payer_rows['Drug_Class'] == drug_class].copy()
     if tier_data.empty:
         return tier_data
     # Sort: Preferred first, then Non-Preferred, then Restricted, then Excluded
@@ -2716,16 +2881,13 @@ def build_formulary_html_table(tier_data, selected_drug: str = "") -> str:
     if tier_data.empty:
         return '<div style="color:#6B7280;font-size:0.85em;padding:4px 0;">No formulary data available for this payer/drug class.</div>'
     rows_html = ""
-    for _, r in tier_data.iterrows():
+    for r in tier_data.to_dict('records'):
         drug = r.get('Drug_Name', '?')
         status = r.get('Formulary_Status', '?')
-        tier = r.get('Tier', '—')
-        step = r.get('Step_Within_Class', '—')
-        ql = r.get('Quantity_Limit', '—')
         # Clean NaN values
-        tier = tier if pd.notna(tier) and str(tier).strip() else '—'
-        step = step if pd.notna(step) and str(step).strip() else '—'
-        ql = ql if pd.notna(ql) and str(ql).strip() else '—'
+        tier = _clean(r.get('Tier')).strip() or '—'
+        step = _clean(r.get('Step_Within_Class')).strip() or '—'
+        ql = _clean(r.get('Quantity_Limit')).strip() or '—'
         badge = get_formulary_status_badge(status)
         highlight = ' style="background:#EFF6FF;"' if drug == selected_drug else ''
         rows_html += f'<tr{highlight}><td style="padding:4px 8px;font-weight:{"700" if drug == selected_drug else "400"}">{drug}</td><td style="padding:4px 8px;">{badge}</td><td style="padding:4px 8px;font-size:0.85em;">{tier}</td><td style="padding:4px 8px;font-size:0.85em;">{step}</td><td style="padding:4px 8px;font-size:0.85em;">{ql}</td></tr>'
@@ -2735,10 +2897,373 @@ def build_formulary_html_table(tier_data, selected_drug: str = "") -> str:
 </tr></thead><tbody>{rows_html}</tbody></table>'''
 
 
+# Diagnosis -> ICD-10 code cited in PA letters
+_ICD10_REF = {
+    'Chronic Migraine': 'G43.709',
+    'Episodic Migraine': 'G43.009',
+    'Cluster Headache': 'G44.009'
+}
+
+def policy_row_key(row) -> str:
+    """Short content hash of a policy row, used as its PA cache key."""
+    return hashlib.blake2b(repr(tuple(row.values)).encode(), digest_size=8).hexdigest()
+
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def build_pa_text(row_key, diag, age, drug, user_mode, prior_meds, medication_trials,
+                  selected_drug, generated_on, _row, _formulary_by_payer):
+    """PA letter text for a policy row; cached on row_key + patient inputs (_row is not hashed)."""
+    row = _row
+    state = row['State']
+    is_pediatric = age < 18
+    
+    # Determine ICD-10 code based on diagnosis
+    icd10_code = _ICD10_REF.get(diag, 'G43.709')
+    
+    # Formulary status for the requested drug (shared by both letter formats)
+    _pa_vault_id = row.get('Vault_Payer_ID', '')
+    _pa_drug_cls = row.get('Drug_Class', '')
+    _pa_sel_drug = selected_drug
+    _pa_tier = None
+    if _pa_vault_id and _pa_drug_cls and _formulary_by_payer:
+        _pa_tier = lookup_formulary_for_policy(_formulary_by_payer, _pa_vault_id, _pa_drug_cls)
+    
+    if user_mode == 'pcp':
+        # Build pediatric section if needed
+        pediatric_section = ""
+        if is_pediatric:
+            pediatric_section = f"""
+PEDIATRIC CONSIDERATIONS
+────────────────────────
+Patient Age: {age} years (Pediatric)
+
+FDA-Approved CGRP Medications for Pediatric Migraine Prevention:
+• Aimovig (erenumab): Approved for ages 12+ for migraine prevention
+• Ajovy (fremanezumab): Approved for ages 12+ for migraine prevention  
+• Emgality (galcanezumab): Approved for ages 12+ for migraine prevention
+
+Dosing: Standard adult dosing is appropriate for patients ≥12 years.
+
+This patient meets age criteria for FDA-approved CGRP therapy.
+
+"""
+        
+        pa_parts = [f"""══════════════════════════════════════════════════════════════
+              PRIOR AUTHORIZATION REQUEST - {drug.upper()}
+              Generated: {generated_on.strftime('%B %d, %Y')}
+══════════════════════════════════════════════════════════════
+
+PATIENT INFORMATION
+───────────────────
+Diagnosis: {diag}
+ICD-10 Code: {icd10_code}
+Patient Age: {age} years{" (PEDIATRIC)" if is_pediatric else ""}
+{pediatric_section}
+REQUESTED MEDICATION
+────────────────────
+Drug Class: {drug}
+Payer: {row['Payer_Name']}
+Line of Business: {row['LOB']}
+State: {state}
+
+"""]
+        # Inject formulary status into PCP PA letter
+        if _pa_tier is not None and not _pa_tier.empty:
+            pa_parts.append("FORMULARY STATUS\n────────────────\n")
+            if _pa_sel_drug:
+                _sel_rows = _pa_tier[_pa_tier['Drug_Name'] == _pa_sel_drug]
+                if not _sel_rows.empty:
+                    _s = _sel_rows.iloc[0]
+                    _st_val = _s.get('Formulary_Status', 'Unknown')
+                    _t_val = _s.get('Tier', '—')
+                    pa_parts.append(f"Requested Drug: {_pa_sel_drug} ({_st_val}, {_t_val})\n")
+                    if _st_val in ('Non-Preferred', 'Restricted', 'Excluded'):
+                        _pref = _pa_tier[_pa_tier['Formulary_Status'] == 'Preferred']
+                        if not _pref.empty:
+                            _alt = _pref.iloc[0]
+                            pa_parts.append(f"Preferred Alternative: {_alt['Drug_Name']} ({_alt.get('Tier', '—')})\n")
+                        pa_parts.append("\nClinical justification for non-preferred agent:\n")
+                        pa_parts.append("• [Patient has failed/is intolerant to preferred agent]\n")
+                        pa_parts.append("• [Specific clinical reason for this drug over preferred]\n")
+            else:
+                # Vectorized column concat instead of one Series per row
+                pa_parts.extend((
+                    "  " + _pa_tier['Drug_Name'].astype(str) + ": " + _pa_tier['Formulary_Status'].astype(str)
+                    + " (" + _pa_tier['Tier'].astype(str) + ")\n"
+                ).tolist())
+            pa_parts.append("\n")
+
+        if row['Step_Therapy_Required'] == 'Yes':
+            step_req = _clean(row.get('Step_1_Requirement'), 'Prior oral preventive trials required')
+            step_dur = _clean(row.get('Step_1_Duration'), 'Per policy requirements')
+            pa_parts.append(f"""STEP THERAPY REQUIREMENTS
+─────────────────────────
+Policy Requirement: {step_req}
+Required Duration: {step_dur}
+
+""")
+            # Check for enriched medication trial data first
+            if medication_trials:
+                pa_parts.append("""DOCUMENTED PRIOR MEDICATION TRIALS
+──────────────────────────────────
+""")
+                for i, trial in enumerate(medication_trials, 1):
+                    # Format each trial with available details
+                    trial_line = f"  {i}. {trial.medication_name}"
+                    if trial.drug_class:
+                        trial_line += f" ({trial.drug_class})"
+                    pa_parts.append(trial_line + "\n")
+                    
+                    details = []
+                    if trial.dose:
+                        details.append(f"Dose: {trial.dose}")
+                    if trial.duration_weeks:
+                        details.append(f"Duration: {trial.duration_weeks} weeks")
+                    if trial.reason_stopped:
+                        details.append(f"Discontinued: {trial.reason_stopped}")
+                    
+                    if details:
+                        pa_parts.append(f"     → {' | '.join(details)}\n")
+                    pa_parts.append("\n")
+                
+                pa_parts.append("""  ✓ Patient has completed required step therapy trials as documented above.
+
+""")
+            # Fall back to simple medication list if no enriched data
+            elif prior_meds:
+                pa_parts.append("""DOCUMENTED PRIOR MEDICATION TRIALS
+──────────────────────────────────
+""")
+                for i, med in enumerate(prior_meds, 1):
+                    # Handle both string and dict formats
+                    if isinstance(med, str):
+                        med_line = med
+                    elif isinstance(med, dict):
+                        med_line = med.get('name', 'Unknown')
+                        details = []
+                        if med.get('dose'):
+                            details.append(med['dose'])
+                        if med.get('duration_weeks'):
+                            details.append(f"{med['duration_weeks']} weeks")
+                        if med.get('reason_stopped'):
+                            details.append(f"D/C: {med['reason_stopped']}")
+                        if details:
+                            med_line += f" - {', '.join(details)}"
+                    else:
+                        med_line = str(med)
+                    pa_parts.append(f"  {i}. {med_line}\n")
+                pa_parts.append("""
+  ✓ Patient has completed required step therapy trials as documented above.
+
+""")
+            else:
+                pa_parts.append("""PRIOR MEDICATION TRIALS
+───────────────────────
+  [Document each failed medication with:]
+  • Drug name and maximum dose reached
+  • Start and end dates (minimum 8 weeks)
+  • Specific reason for discontinuation
+
+""")
+        pa_parts.append(f"""
+CLINICAL RATIONALE
+──────────────────
+Patient has documented history of {diag} with inadequate response 
+to conventional preventive therapies. {drug} is medically necessary 
+due to:
+• Failure/intolerance of prior preventive medications as documented above
+• Significant impact on daily functioning and quality of life
+• No contraindications to requested therapy
+
+REFERENCES
+──────────
+This request aligns with:
+• American Headache Society Consensus Statement (2021)
+• ICHD-3 Diagnostic Criteria
+• AAN/AHS Practice Guidelines
+
+══════════════════════════════════════════════════════════════
+""")
+    else:
+        # Specialist compact mode
+        pediatric_note = " [PEDIATRIC - FDA approved 12+]" if is_pediatric else ""
+        pa_parts = [f"""PRIOR AUTHORIZATION REQUEST
+{generated_on.strftime('%Y-%m-%d')} | {row['Payer_Name']} | {state}
+
+Dx: {diag} ({icd10_code})
+Age: {age}y{pediatric_note}
+Rx: {drug} ({row['Medication_Category']})
+LOB: {row['LOB']}
+"""]
+        # Inject compact formulary status for specialist mode
+        if _pa_tier is not None and not _pa_tier.empty and _pa_sel_drug:
+            _sp_sel = _pa_tier[_pa_tier['Drug_Name'] == _pa_sel_drug]
+            if not _sp_sel.empty:
+                _sp_s = _sp_sel.iloc[0]
+                pa_parts.append(f"Formulary: {_pa_sel_drug} → {_sp_s.get('Formulary_Status','?')} ({_sp_s.get('Tier','—')})\n")
+
+        if row['Step_Therapy_Required'] == 'Yes':
+            step_req = _clean(row.get('Step_1_Requirement'), 'Prior preventive')
+            step_dur = _clean(row.get('Step_1_Duration'), 'Per policy')
+            pa_parts.append(f"""
+Step Therapy: REQUIRED ({step_req}, {step_dur})
+""")
+            # Add prior meds in compact format
+            if prior_meds:
+                pa_parts.append("Prior Trials:\n")
+                for med in prior_meds:
+                    # Handle both string and dict formats
+                    if isinstance(med, str):
+                        med_line = med
+                    elif isinstance(med, dict):
+                        med_line = med.get('name', 'Unknown')
+                        if med.get('dose'):
+                            med_line += f" {med['dose']}"
+                        if med.get('duration_weeks'):
+                            med_line += f" x{med['duration_weeks']}wk"
+                        if med.get('reason_stopped'):
+                            med_line += f" → {med['reason_stopped']}"
+                    else:
+                        med_line = str(med)
+                    pa_parts.append(f"  • {med_line}\n")
+            pa_parts.append("Status: Step therapy completed\n")
+        else:
+            pa_parts.append("\nStep Therapy: Not required\n")
+        
+        pa_parts.append("\nRefs: AHS 2024, ICHD-3, AAN Guidelines")
+    
+    return "".join(pa_parts)
+
+
+@st.cache_data(show_spinner=False)
+def _pa_filename(payer: str, day: str) -> str:
+    """Download filename for a PA letter, memoized per (payer, day)."""
+    return f"PA_Template_{payer.replace(' ', '_')}_{day}.txt"
+
+
+@st.cache_resource
+def _monday_session():
+    """Keep-alive HTTP session for Monday.com, shared across reruns so TLS connections are reused"""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    return session
+
 def send_lead_to_monday(name, email, practice, state, payer, drug_class, notes):
     """Send lead data to Monday.com CRM board"""
+    # Get API key from secrets
+    try:
+        api_key = st.secrets.get("MONDAY_API_KEY", None)
+    except:
+        api_key = None
+    
+    if not api_key:
+        return False, "Monday.com API key not configured"
+    
+    # Monday.com board and group IDs
+    BOARD_ID = 18397061224  # Headache Vault - Contacts & Prospects
+    GROUP_ID = "group_mkzxdy1j"  # Demo Users group
+    
+    # Build column values
+    column_values = {
+        "email_mkzxqtxn": {"email": email, "text": email},
+        "text_mkzxpp92": state,  # State
+        "text_mkzxdt7e": practice if practice else "Demo User",  # Specialty/Practice
+        "color_mkzx5w7m": {"label": "Demo User"},  # Contact Type
+        "color_mkzxsgea": {"label": "PA Demo"},  # Lead Source
+        "color_mkzxp42x": {"label": "New Lead"},  # Sales Stage
+        "date_mkzxqhxz": {"date": datetime.now().strftime("%Y-%m-%d")},  # First Contact Date
+        "long_text_mkzxe3nf": {"text": f"PA Demo Lead\\nPayer: {payer}\\nDrug: {drug_class}\\n{notes}"}  # Notes
+    }
+    
+    # GraphQL mutation
+    mutation = """
+    mutation ($boardId: ID!, $groupId: String!, $itemName: String!, $columnValues: JSON!) {
+        create_item (
+            board_id: $boardId,
+            group_id: $groupId,
+            item_name: $itemName,
+            column_values: $columnValues
+        ) {
+            id
+        }
+    }
+    """
+    
+    variables = {
+        "boardId": str(BOARD_ID),
+        "groupId": GROUP_ID,
+        "itemName": name if name else email.split("@")[0],
+        "columnValues": json.dumps(column_values)
+    }
+    
+    headers = {
+        "Authorization": api_key,
+        "Content-Type": "application/json"
+    }
+    
+    try:
+        response = _monday_session().post(
+            "https://api.monday.com/v2",
+            json={"query": mutation, "variables": variables},
+            headers=headers,
+            timeout=5
+        )
+        
+        if response.status_code == 200:
+            result = response.json()
+            if "data" in result and result["data"]["create_item"]:
+                return True, result["data"]["create_item"]["id"]
+            else:
+                return False, result.get("errors", "Unknown error")
+        else:
+            return False, f"HTTP {response.status_code}"
+    except Exception as e:
+        return False, str(e)
 
 
+# =========================================================================
+# MEDICATION REFERENCE LISTS (for check_criteria_met)
+# =========================================================================
+# Oral preventive classes in the order a med is credited to them
+_PREVENTIVE_CLASS_TOKENS = (
+    ('Beta-blocker', ('propranolol', 'metoprolol', 'atenolol', 'nadolol', 'timolol')),
+    ('Anticonvulsant', ('topiramate', 'topamax', 'valproate', 'depakote', 'divalproex', 'gabapentin')),
+    ('Antidepressant', ('amitriptyline', 'nortriptyline', 'venlafaxine', 'duloxetine', 'effexor', 'cymbalta')),
+    ('CCB', ('verapamil', 'flunarizine')),
+)
+_PREVENTIVE_CLASSES = tuple(med_class for med_class, _ in _PREVENTIVE_CLASS_TOKENS)
+_PREVENTIVE_TOKEN_CLASS = {tok: med_class for med_class, toks in _PREVENTIVE_CLASS_TOKENS for tok in toks}
+_TRIPTANS = frozenset(('sumatriptan', 'rizatriptan', 'eletriptan', 'zolmitriptan',
+                       'naratriptan', 'frovatriptan', 'almotriptan'))
+
+# Med strings are tokenized into words once; drug names are then hash lookups
+_WORD_RE = re.compile(r'[a-z]+')
+
+# Clinical-note phrases that trigger step-therapy bypasses
+_CV_CONTRAINDICATION_KEYWORDS = (
+    'coronary artery disease', 'cad', 'myocardial infarction', 'prior mi',
+    'heart attack', 'ischemic heart', 'peripheral vascular disease', 'pvd',
+    'cerebrovascular', 'stroke', 'cva', 'tia', 'transient ischemic',
+    'uncontrolled hypertension', 'uncontrolled htn', 'severe hypertension',
+    'vasospastic angina', 'prinzmetal', 'wolff-parkinson-white', 'wpw',
+    'hemiplegic migraine', 'basilar migraine',
+    'triptans contraindicated', 'triptan contraindicated',
+    'contraindication to triptans', 'cannot use triptans',
+    'cardiovascular contraindication'
+)
+_PREGNANCY_KEYWORDS = (
+    'pregnant', 'pregnancy', 'planning pregnancy', 'childbearing',
+    'reproductive age', 'trying to conceive', 'fertility',
+    'breastfeeding', 'lactating', 'postpartum',
+    'teratogenic contraindication', 'teratogen'
+)
+_SSRI_SNRI_KEYWORDS = (
+    'sertraline', 'zoloft', 'fluoxetine', 'prozac', 'paroxetine', 'paxil',
+    'escitalopram', 'lexapro', 'citalopram', 'celexa', 'fluvoxamine', 'luvox',
+    'venlafaxine', 'effexor', 'duloxetine', 'cymbalta', 'desvenlafaxine', 'pristiq',
+    'levomilnacipran', 'fetzima', 'ssri', 'snri',
+    'serotonin syndrome risk', 'serotonin syndrome'
+)
+
 def check_criteria_met(step_requirements, prior_medications, diagnosis,
                        parsed_data=None, policy_row=None):
     """
@@ -2769,6 +3294,8 @@ def check_criteria_met(step_requirements, prior_medications, diagnosis,
                 prior_meds_lower.append(m.lower())
             elif isinstance(m, dict) and m.get('name'):
                 prior_meds_lower.append(m['name'].lower())
+    # One haystack for whole-history checks; the separator keeps names from fusing
+    prior_meds_joined = ' | '.join(prior_meds_lower)
     
     # =========================================================================
     # BYPASS DETECTION — Check clinical note for bypass conditions
@@ -2783,37 +3310,13 @@ def check_criteria_met(step_requirements, prior_medications, diagnosis,
                 clinical_note_lower += ' ' + reason
     
     # --- CV Contraindication Detection ---
-    cv_keywords = [
-        'coronary artery disease', 'cad', 'myocardial infarction', 'prior mi',
-        'heart attack', 'ischemic heart', 'peripheral vascular disease', 'pvd',
-        'cerebrovascular', 'stroke', 'cva', 'tia', 'transient ischemic',
-        'uncontrolled hypertension', 'uncontrolled htn', 'severe hypertension',
-        'vasospastic angina', 'prinzmetal', 'wolff-parkinson-white', 'wpw',
-        'hemiplegic migraine', 'basilar migraine',
-        'triptans contraindicated', 'triptan contraindicated',
-        'contraindication to triptans', 'cannot use triptans',
-        'cardiovascular contraindication'
-    ]
-    has_cv_contraindication = any(kw in clinical_note_lower for kw in cv_keywords)
+    has_cv_contraindication = any(kw in clinical_note_lower for kw in _CV_CONTRAINDICATION_KEYWORDS)
     
     # --- Pregnancy / Teratogen Detection ---
-    pregnancy_keywords = [
-        'pregnant', 'pregnancy', 'planning pregnancy', 'childbearing',
-        'reproductive age', 'trying to conceive', 'fertility',
-        'breastfeeding', 'lactating', 'postpartum',
-        'teratogenic contraindication', 'teratogen'
-    ]
-    has_pregnancy_bypass = any(kw in clinical_note_lower for kw in pregnancy_keywords)
+    has_pregnancy_bypass = any(kw in clinical_note_lower for kw in _PREGNANCY_KEYWORDS)
     
     # --- Serotonin Syndrome Risk Detection (SSRI/SNRI + Triptan) ---
-    ssri_snri_keywords = [
-        'sertraline', 'zoloft', 'fluoxetine', 'prozac', 'paroxetine', 'paxil',
-        'escitalopram', 'lexapro', 'citalopram', 'celexa', 'fluvoxamine', 'luvox',
-        'venlafaxine', 'effexor', 'duloxetine', 'cymbalta', 'desvenlafaxine', 'pristiq',
-        'levomilnacipran', 'fetzima', 'ssri', 'snri',
-        'serotonin syndrome risk', 'serotonin syndrome'
-    ]
-    has_serotonin_risk = any(kw in clinical_note_lower for kw in ssri_snri_keywords)
+    has_serotonin_risk = any(kw in clinical_note_lower for kw in _SSRI_SNRI_KEYWORDS)
     
     # --- Acute vs Preventive Detection ---
     is_acute_medication = False
@@ -2822,16 +3325,6 @@ def check_criteria_met(step_requirements, prior_medications, diagnosis,
         drug_class = str(policy_row.get('Drug_Class', '')).lower()
         is_acute_medication = ('acute' in med_category or 'acute' in drug_class)
     
-    # =========================================================================
-    # MEDICATION REFERENCE LISTS
-    # =========================================================================
-    beta_blockers = ['propranolol', 'metoprolol', 'atenolol', 'nadolol', 'timolol']
-    anticonvulsants = ['topiramate', 'topamax', 'valproate', 'depakote', 'divalproex', 'gabapentin']
-    antidepressants = ['amitriptyline', 'nortriptyline', 'venlafaxine', 'duloxetine', 'effexor', 'cymbalta']
-    ccbs = ['verapamil', 'flunarizine']
-    triptans = ['sumatriptan', 'rizatriptan', 'eletriptan', 'zolmitriptan',
-                'naratriptan', 'frovatriptan', 'almotriptan']
-    
     # =========================================================================
     # CRITERIA CHECKS WITH BYPASS LOGIC
     # =========================================================================
@@ -2858,24 +3351,18 @@ def check_criteria_met(step_requirements, prior_medications, diagnosis,
             # Standard preventive checking
             classes_tried = 0
             meds_found = []
+            seen_classes = set()
             
             for med in prior_meds_lower:
-                if any(bb in med for bb in beta_blockers) and \
-                   'Beta-blocker' not in [m.split(' (')[0] for m in meds_found]:
-                    classes_tried += 1
-                    meds_found.append(f"Beta-blocker ({med.title()})")
-                elif any(ac in med for ac in anticonvulsants) and \
-                     'Anticonvulsant' not in [m.split(' (')[0] for m in meds_found]:
-                    classes_tried += 1
-                    meds_found.append(f"Anticonvulsant ({med.title()})")
-                elif any(ad in med for ad in antidepressants) and \
-                     'Antidepressant' not in [m.split(' (')[0] for m in meds_found]:
-                    classes_tried += 1
-                    meds_found.append(f"Antidepressant ({med.title()})")
-                elif any(ccb in med for ccb in ccbs) and \
-                     'CCB' not in [m.split(' (')[0] for m in meds_found]:
-                    classes_tried += 1
-                    meds_found.append(f"CCB ({med.title()})")
+                # Credit the med to the first class (in priority order) it names that isn't counted yet
+                present = {_PREVENTIVE_TOKEN_CLASS[tok] for tok in _WORD_RE.findall(med)
+                           if tok in _PREVENTIVE_TOKEN_CLASS}
+                for med_class in _PREVENTIVE_CLASSES:
+                    if med_class in present and med_class not in seen_classes:
+                        seen_classes.add(med_class)
+                        classes_tried += 1
+                        meds_found.append(f"{med_class} ({med.title()})")
+                        break
             
             if classes_tried >= 2:
                 criteria_status.append(("≥2 oral preventive classes", True, f"{', '.join(meds_found[:3])}"))
@@ -2919,11 +3406,10 @@ def check_criteria_met(step_requirements, prior_medications, diagnosis,
         
         # No bypass — standard triptan checking
         else:
-            triptans_tried = []
-            for med in prior_meds_lower:
-                for t in triptans:
-                    if t in med and t.title() not in triptans_tried:
-                        triptans_tried.append(t.title())
+            # Unique triptans in order of first mention
+            triptans_tried = list(dict.fromkeys(
+                t.title() for t in _WORD_RE.findall(prior_meds_joined) if t in _TRIPTANS
+            ))
             
             if '2' in step_req_lower and 'triptan' in step_req_lower:
                 if len(triptans_tried) >= 2:
@@ -2941,8 +3427,8 @@ def check_criteria_met(step_requirements, prior_medications, diagnosis,
     
     # --- Check 3: Verapamil/Lithium Requirements (Cluster Headache) ---
     if 'verapamil' in step_req_lower or 'lithium' in step_req_lower:
-        verapamil_tried = any('verapamil' in med for med in prior_meds_lower)
-        lithium_tried = any('lithium' in med for med in prior_meds_lower)
+        verapamil_tried = 'verapamil' in prior_meds_joined
+        lithium_tried = 'lithium' in prior_meds_joined
         
         if ' or ' in step_req_lower:  # verapamil OR lithium
             if verapamil_tried or lithium_tried:
@@ -2961,96 +3447,15 @@ def check_criteria_met(step_requirements, prior_medications, diagnosis,
     
     return criteria_status
 
-    
-    # Get API key from secrets
-    try:
-        api_key = st.secrets.get("MONDAY_API_KEY", None)
-    except:
-        api_key = None
-    
-    if not api_key:
-        return False, "Monday.com API key not configured"
-    
-    # Monday.com board and group IDs
-    BOARD_ID = 18397061224  # Headache Vault - Contacts & Prospects
-    GROUP_ID = "group_mkzxdy1j"  # Demo Users group
-    
-    # Build column values
-    column_values = {
-        "email_mkzxqtxn": {"email": email, "text": email},
-        "text_mkzxpp92": state,  # State
-        "text_mkzxdt7e": practice if practice else "Demo User",  # Specialty/Practice
-        "color_mkzx5w7m": {"label": "Demo User"},  # Contact Type
-        "color_mkzxsgea": {"label": "PA Demo"},  # Lead Source
-        "color_mkzxp42x": {"label": "New Lead"},  # Sales Stage
-        "date_mkzxqhxz": {"date": datetime.now().strftime("%Y-%m-%d")},  # First Contact Date
-        "long_text_mkzxe3nf": {"text": f"PA Demo Lead\\nPayer: {payer}\\nDrug: {drug_class}\\n{notes}"}  # Notes
-    }
-    
-    # GraphQL mutation
-    mutation = """
-    mutation ($boardId: ID!, $groupId: String!, $itemName: String!, $columnValues: JSON!) {
-        create_item (
-            board_id: $boardId,
-            group_id: $groupId,
-            item_name: $itemName,
-            column_values: $columnValues
-        ) {
-            id
-        }
-    }
-    """
-    
-    variables = {
-        "boardId": str(BOARD_ID),
-        "groupId": GROUP_ID,
-        "itemName": name if name else email.split("@")[0],
-        "columnValues": json.dumps(column_values)
-    }
-    
-    headers = {
-        "Authorization": api_key,
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        response = requests.post(
-            "https://api.monday.com/v2",
-            json={"query": mutation, "variables": variables},
-            headers=headers
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            if "data" in result and result["data"]["create_item"]:
-                return True, result["data"]["create_item"]["id"]
-            else:
-                return False, result.get("errors", "Unknown error")
-        else:
-            return False, f"HTTP {response.status_code}"
-    except Exception as e:
-        return False, str(e)
-
-# Initialize session state (unified data flow)
+# Initialize session state (unified data flow; includes HIPAA gate and email capture keys)
 SessionStateManager.initialize()
 
-# Guided data collection state
-if 'data_collection_state' not in st.session_state:
-    st.session_state.data_collection_state = None
-
-# Email capture state
-if 'show_email_form' not in st.session_state:
-    st.session_state.show_email_form = False
-if 'pa_text_for_email' not in st.session_state:
-    st.session_state.pa_text_for_email = None
-if 'pa_email_context' not in st.session_state:
-    st.session_state.pa_email_context = {}
-if 'email_captures' not in st.session_state:
-    st.session_state.email_captures = []
-
 # Load data
 # Unpack databases with descriptive names
-payer_registry, payer_policies, formulary_tier_map, denial_codes, pediatric_overrides, state_regulations, icd10_codes, therapeutic_doses, otc_medications = load_databases()
+vault_db = build_vault_db(load_databases())
+payer_registry, payer_policies, formulary_tier_map = vault_db.payer_registry, vault_db.payer_policies, vault_db.formulary_tier_map
+denial_codes, pediatric_overrides, state_regulations = vault_db.denial_codes, vault_db.pediatric_overrides, vault_db.state_regulations
+icd10_codes, therapeutic_doses, otc_medications = vault_db.icd10_codes, vault_db.therapeutic_doses, vault_db.otc_medications
 
 # Aliases matching schema doc convention
 db_a = payer_registry
@@ -3068,6 +3473,241 @@ icd10 = icd10_codes
 therapeutic = therapeutic_doses
 otc = otc_medications
 
+# Policy cards rendered per "Show more" step on the Search page
+RESULTS_PAGE_SIZE = 5
+
+# Static HTML blocks (kept out of the page code so they are defined once)
+_PA_TIPS_HTML = """
+<div class="learning-moment">
+    <div class="learning-moment-title">💡 PA Documentation Tips</div>
+    <div class="learning-moment-content">
+        <strong>Keys to approval:</strong> Be specific about medication names, exact dosages, 
+        trial durations with dates, and clear failure reasons. Vague language like 
+        "tried several medications" or "adequate trial" often leads to denials.
+    </div>
+</div>
+"""
+
+# ICHD-3 medication overuse thresholds (days/month) and the MOH checker verdicts
+_MOH_SIMPLE_THRESH, _MOH_COMBO_THRESH = 15, 10
+
+def moh_flags(simple_days: np.ndarray, combo_days: np.ndarray) -> np.ndarray:
+    """Vectorized MOH risk flags for arrays of simple/combination analgesic days per month."""
+    return (simple_days >= _MOH_SIMPLE_THRESH) | (combo_days >= _MOH_COMBO_THRESH)
+
+_MOH_WARN_MD = ("**MOH RISK IDENTIFIED**\n\n"
+                "Patient meets ICHD-3 criteria for medication overuse. Consider:\n"
+                "- ICD-10 Code: G44.41 (Drug-induced headache, NEC)\n"
+                "- CGRP therapy (lower MOH risk per AHS 2021)\n"
+                "- Medication withdrawal protocol")
+
+_MOH_OK_MD = "No medication overuse detected based on current usage pattern"
+
+_FOOTER_HTML = """
+<div style="background: #FEF2F2; border: 1px solid #FECACA; border-radius: 8px; padding: 16px; margin-bottom: 1.5rem;">
+    <div style="font-weight: 700; color: #991B1B; margin-bottom: 8px; font-size: 0.9rem;">
+        ⚖️ Legal Disclaimer — Please Read
+    </div>
+    <div style="font-size: 0.8rem; color: #7F1D1D; line-height: 1.5;">
+        <strong>NOT HIPAA COMPLIANT:</strong> The Headache Vault Demo is a prototype for demonstration and 
+        educational purposes only. This application uses external AI services (Anthropic Claude API) and 
+        cloud hosting (Streamlit) that have NOT been configured for HIPAA compliance. Do not enter Protected 
+        Health Information (PHI) including patient names, DOB, MRN, SSN, specific dates of service, or contact information.
+        <br><br>
+        <strong>NOT MEDICAL/LEGAL ADVICE:</strong> Information provided is for educational purposes only and does not 
+        constitute medical, legal, or billing advice. Always verify payer requirements directly.
+        <br><br>
+        <strong>PRODUCTION VERSION:</strong> A HIPAA-compliant version with BAA coverage is planned for August 2026. 
+        Contact info@headachevault.com for enterprise inquiries.
+    </div>
+</div>
+
+<div class="production-footer">
+    <div style="margin-bottom: 1rem;">
+        <span class="footer-badge">📊 CMS Data Sources</span>
+        <span class="footer-badge">🏥 State DOI Verified</span>
+        <span class="footer-badge" style="background: #FEF3C7; color: #92400E;">⚠️ Demo Only</span>
+    </div>
+    <div style="font-size: 0.9rem; color: #262730; margin-bottom: 1rem;">
+        <strong style='color: #4B0082; font-size: 1.1rem;'>The Headache Vault PA Engine</strong><br>
+        <span style='color: #5A5A5A;'>Demo v1.0 | February 2026</span>
+    </div>
+    <div style="font-size: 0.85rem; color: #5A5A5A; margin-bottom: 1rem;">
+        Infrastructure to Scale Specialist-Level Care<br>
+        <strong>752 payer policies</strong> • <strong>50 states</strong> • <strong>1,088 payers</strong><br>
+        Coverage expanding weekly
+    </div>
+    <div style="font-size: 0.8rem; color: #708090;">
+        Clinical logic based on <strong>AHS 2021/2024</strong>, <strong>ACP 2025</strong>, <strong>ICHD-3 Criteria</strong><br>
+        🤖 Powered by <strong>Anthropic Claude AI</strong> | ⚡ Average response time: <strong>&lt;2 seconds</strong>
+    </div>
+    <div style="margin-top: 1rem; font-size: 0.75rem; color: #999;">
+        📅 Last Updated: January 15, 2026 | 🔄 Database refreshed daily<br>
+        <span style="color: #DC2626;">⚠️ NOT FOR CLINICAL USE — DEMONSTRATION ONLY</span>
+    </div>
+</div>
+"""
+
+# Page chrome (HIPAA gate, banner, title, mode badge) and dashboard stat cards
+_HIPAA_GATE_HEADER_HTML = """
+    <div style="background: linear-gradient(135deg, #4B0082 0%, #6A0DAD 100%); 
+                color: white; padding: 2rem; border-radius: 12px; margin-bottom: 1rem; text-align: center;">
+        <div style="font-size: 2rem; margin-bottom: 0.5rem; color: #FFFFFF;">💊 The Headache Vault</div>
+        <div style="font-size: 1rem; color: rgba(255,255,255,0.9);">Prior Authorization Automation Demo</div>
+    </div>
+    """
+
+_HIPAA_GATE_NOTICE_HTML = """
+    <div style="background: #FEF3C7; border: 2px solid #F59E0B; border-radius: 12px; padding: 1.5rem; margin: 1rem 0;">
+        <div style="display: flex; align-items: flex-start; gap: 12px;">
+            <span style="font-size: 32px;">⚠️</span>
+            <div>
+                <div style="font-size: 1.25rem; font-weight: 700; color: #92400E; margin-bottom: 0.75rem;">
+                    Important: Demo Environment — NOT HIPAA Compliant
+                </div>
+                <div style="color: #78350F; font-size: 0.95rem; line-height: 1.6;">
+                    <p style="margin-bottom: 0.75rem;">
+                        This demonstration application uses external AI services (Anthropic Claude) and cloud hosting 
+                        that have <strong>NOT been configured for HIPAA compliance</strong>.
+                    </p>
+                    <p style="margin-bottom: 0.75rem; font-weight: 600;">
+                        🚫 DO NOT ENTER any Protected Health Information (PHI):
+                    </p>
+                    <ul style="margin: 0.5rem 0 0.75rem 1.25rem; padding: 0;">
+                        <li>Patient names, dates of birth, or Social Security numbers</li>
+                        <li>Medical record numbers or insurance member IDs</li>
+                        <li>Specific dates of service or appointment dates</li>
+                        <li>Addresses, phone numbers, or email addresses</li>
+                    </ul>
+                    <p style="margin-bottom: 0;">
+                        ✅ <strong>Safe to use:</strong> Age (not DOB), gender, state, insurance company name, 
+                        diagnosis codes, medication names/doses, and de-identified treatment history.
+                    </p>
+                </div>
+            </div>
+        </div>
+    </div>
+    """
+
+_HIPAA_GATE_ABOUT_HTML = """
+    <div style="background: #F3F4F6; border-radius: 8px; padding: 1rem; margin: 1rem 0; font-size: 0.85rem; color: #4B5563;">
+        <strong>About this Demo:</strong> The Headache Vault PA Engine demonstrates automated prior authorization 
+        workflows for headache medications. Use sample data or fully de-identified scenarios only.
+        <br><br>
+        <strong>Production Version:</strong> A HIPAA-compliant production version with BAA coverage is planned for August 2026.
+    </div>
+    """
+
+# The whole pre-acknowledgement screen, sent as one element
+_HIPAA_GATE_HTML = _HIPAA_GATE_HEADER_HTML + _HIPAA_GATE_NOTICE_HTML + _HIPAA_GATE_ABOUT_HTML
+
+_GLOBAL_BANNER_HTML = """
+<div style="background: linear-gradient(90deg, #DC2626 0%, #B91C1C 100%); 
+            color: white; 
+            padding: 10px 16px; 
+            border-radius: 8px; 
+            margin-bottom: 16px;
+            display: flex;
+            align-items: center;
+            gap: 10px;
+            font-size: 0.9rem;">
+    <span style="font-size: 20px;">⚠️</span>
+    <div>
+        <strong>DEMO ENVIRONMENT — NOT HIPAA COMPLIANT</strong>
+        <span style="opacity: 0.9; margin-left: 8px;">
+            Do NOT enter real patient information. Use de-identified or sample data only.
+        </span>
+    </div>
+</div>
+"""
+
+_TITLE_HTML = """
+    <div style="text-align: left; margin-bottom: 1rem;">
+        <div class="main-header">The Headache Vault</div>
+        <div class="sub-header">Prior Authorization Automation for Headache Medicine</div>
+        <div style="color: #262730; font-size: 0.95rem; font-weight: 400; font-family: 'Source Sans Pro', sans-serif;">
+            Infrastructure to Scale Specialist-Level Care
+        </div>
+    </div>
+    """
+
+# Persona toggle labels, in display order
+_MODE_OPTIONS = {
+    'pcp': '👨‍⚕️ PCP / New to CGRPs (Show Guidance)',
+    'specialist': '⚡ Specialist (Fast Mode)'
+}
+
+_MODE_BADGE_HTML = {
+    'pcp': """
+    <div style="text-align: center; margin: 0.5rem 0 1rem 0;">
+        <span style="background: #F0FFF4; color: #276749; padding: 0.35rem 0.75rem; border-radius: 20px; font-size: 0.8rem; font-weight: 500;">
+            📘 Guidance Mode Active — Tips and learning moments will appear throughout
+        </span>
+    </div>
+    """,
+    'specialist': """
+    <div style="text-align: center; margin: 0.5rem 0 1rem 0;">
+        <span style="background: #EBF8FF; color: #2B6CB0; padding: 0.35rem 0.75rem; border-radius: 20px; font-size: 0.8rem; font-weight: 500;">
+            ⚡ Fast Mode Active — Clean data, no interruptions
+        </span>
+    </div>
+    """,
+}
+
+_STAT_CARD_TMPL = """        <div class="stat-card" style="background: linear-gradient(135deg, #4B0082 0%, #6A0DAD 100%); padding: 1.5rem; border-radius: 12px; text-align: center; box-shadow: 0 4px 6px rgba(75, 0, 130, 0.3);">
+            <div class="stat-number" style="font-size: 2.75rem; font-weight: 800; margin: 0;"><span style="color: #FFFFFF !important; text-shadow: 1px 1px 3px rgba(0,0,0,0.4);">{number}</span></div>
+            <div class="stat-label" style="font-size: 1rem; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; margin-top: 0.5rem;"><span style="color: #E6E6FA !important; text-shadow: 1px 1px 2px rgba(0,0,0,0.3);">{label}</span></div>
+        </div>"""
+_STATS = (('752', 'Payer Policies'), ('1,088', 'Payers Covered'), ('50', 'States'), ('8', 'Drug Classes'))
+_STATS_ROW_HTML = ('\n    <div style="display: grid; grid-template-columns: repeat(4, 1fr); gap: 1rem;">\n'
+                   + '\n'.join(_STAT_CARD_TMPL.format(number=n, label=l) for n, l in _STATS)
+                   + '\n    </div>\n    ')
+
+# Dashboard "System Status" row: three alert-style boxes in one flex element
+_STATUS_BOX_STYLE = "flex: 1; padding: 1rem; border-radius: 8px; font-size: 0.95rem;"
+_SYSTEM_STATUS_HTML = f"""
+<div style="display: flex; gap: 1rem;">
+    <div style="{_STATUS_BOX_STYLE} background: #F0FFF4; color: #276749;">🟢 <strong>All Systems Operational</strong></div>
+    <div style="{_STATUS_BOX_STYLE} background: #EBF8FF; color: #2B6CB0;">⚡ <strong>Response Time:</strong> &lt;2 seconds</div>
+    <div style="{_STATUS_BOX_STYLE} background: #EBF8FF; color: #2B6CB0;">📅 <strong>Last Updated:</strong> January 15, 2026</div>
+</div>
+"""
+
+
+# Per-state policy views (avoids re-masking db_b on every rerun)
+policies_by_state = build_state_index(db_b)
+_OTC_MOH_VIEW = build_otc_moh_view(otc)
+
+@st.cache_data(show_spinner=False)
+def states_sorted():
+    """All states with policies, sorted for dropdowns"""
+    return sorted(policies_by_state)
+
+@st.cache_resource
+def states_set():
+    """frozenset of states with policies, for O(1) membership checks"""
+    return frozenset(policies_by_state)
+
+@st.cache_resource
+def state_to_idx():
+    """State -> position in states_sorted(), for selectbox defaults"""
+    return {s: i for i, s in enumerate(states_sorted())}
+
+@st.cache_data(show_spinner=False)
+def payers_for_state(state):
+    """Sorted payer names with policies in a state"""
+    return sorted(policies_by_state[state]['Payer_Name'].unique().tolist())
+
+@st.cache_data(show_spinner=False)
+def lower_payers_for_state(state):
+    """Lowercased payers_for_state() for case-insensitive matching"""
+    return [p.lower() for p in payers_for_state(state)]
+
+@st.cache_data(show_spinner=False)
+def drug_classes_for_state(state):
+    """Sorted drug classes with policies in a state"""
+    return sorted(policies_by_state[state]['Drug_Class'].unique().tolist())
+
 # Helper function to create copy button HTML
 def create_copy_button(text, button_id):
     """Create a copy-to-clipboard button"""
@@ -3226,6 +3866,41 @@ CITY_TO_STATE = {
 }
 
 
+# Compiled once; the validators run on every parsed note
+# City indicators longest-first, plus one matcher that reports every city mentioned in a note
+_CITIES_BY_LENGTH = tuple(sorted(CITY_TO_STATE, key=len, reverse=True))
+_CITY_RE = re.compile('(?=(' + '|'.join(map(re.escape, _CITIES_BY_LENGTH)) + '))')
+
+_MD_CREDENTIAL_RE = re.compile(r'(?:dr\.?|[a-z]{2,})\s*,?\s*md\b')
+_MD_LOCATION_RE = re.compile(r'(?:lives?|resides?|from|in)\s+.*\bmd\b')
+_AGE_PATTERNS = tuple(re.compile(p) for p in (
+    r'\b\d{1,3}[\s\-]*(?:year|yr|y/?o|years?\s*old)\b',
+    r'\b(?:age|aged)\s*\d{1,3}\b',
+    r'\b\d{1,3}[\s\-]*(?:yo|y\.o\.)\b',
+    r'\b\d{1,3}\s*(?:f|m)\b',
+    r'\b(?:f|m)\s*\d{1,3}\b',
+))
+
+@lru_cache(maxsize=None)
+def _abbrev_patterns(abbrev_lower, strict):
+    """Compiled patterns for a state abbreviation; strict ones for abbreviations that are also words."""
+    if not strict:
+        patterns = (
+            rf'[\s,\.]{abbrev_lower}[\s,\.\d]',
+            rf'[\s,\.]{abbrev_lower}$',
+        )
+    else:
+        patterns = (
+            rf',\s*{abbrev_lower}\s*[.\s\d]',
+            rf',\s*{abbrev_lower}$',
+            rf'lives?\s+in\s+[\w\s,]+\b{abbrev_lower}\b',
+            rf'resides?\s+in\s+[\w\s,]+\b{abbrev_lower}\b',
+            rf'from\s+[\w\s,]+\b{abbrev_lower}\b',
+            rf'\b{abbrev_lower}\s+\d{{5}}\b',
+        )
+    return tuple(re.compile(p) for p in patterns)
+
+
 def validate_extracted_state(parsed_state, note_text):
     """
     Validate Claude's state extraction against the actual note text.
@@ -3260,49 +3935,21 @@ def validate_extracted_state(parsed_state, note_text):
     abbrev_lower = state_code.lower()
     
     if state_code not in AMBIGUOUS_ABBREVIATIONS:
-        safe_patterns = [
-            rf'[\s,\.]{abbrev_lower}[\s,\.\d]',
-            rf'[\s,\.]{abbrev_lower}$',
-        ]
-        for pattern in safe_patterns:
-            if re.search(pattern, note_lower):
-                return state_code, None
+        if any(pat.search(note_lower) for pat in _abbrev_patterns(abbrev_lower, strict=False)):
+            return state_code, None
     else:
-        if state_code == 'MD':
-            md_credential = re.search(r'(?:dr\.?|[a-z]{2,})\s*,?\s*md\b', note_lower)
-            md_location = re.search(r'(?:lives?|resides?|from|in)\s+.*\bmd\b', note_lower)
-            if md_credential and not md_location:
-                pass
-            else:
-                strict_patterns = [
-                    rf',\s*{abbrev_lower}\s*[.\s\d]',
-                    rf',\s*{abbrev_lower}$',
-                    rf'lives?\s+in\s+[\w\s,]+\b{abbrev_lower}\b',
-                    rf'resides?\s+in\s+[\w\s,]+\b{abbrev_lower}\b',
-                    rf'from\s+[\w\s,]+\b{abbrev_lower}\b',
-                    rf'\b{abbrev_lower}\s+\d{{5}}\b',
-                ]
-                for pattern in strict_patterns:
-                    if re.search(pattern, note_lower):
-                        return state_code, None
-        else:
-            strict_patterns = [
-                rf',\s*{abbrev_lower}\s*[.\s\d]',
-                rf',\s*{abbrev_lower}$',
-                rf'lives?\s+in\s+[\w\s,]+\b{abbrev_lower}\b',
-                rf'resides?\s+in\s+[\w\s,]+\b{abbrev_lower}\b',
-                rf'from\s+[\w\s,]+\b{abbrev_lower}\b',
-                rf'\b{abbrev_lower}\s+\d{{5}}\b',
-            ]
-            for pattern in strict_patterns:
-                if re.search(pattern, note_lower):
-                    return state_code, None
+        # "Dr. Smith, MD" is a credential, not Maryland, unless the note also places the patient in MD
+        md_credential_only = (state_code == 'MD'
+                              and _MD_CREDENTIAL_RE.search(note_lower)
+                              and not _MD_LOCATION_RE.search(note_lower))
+        if not md_credential_only and any(pat.search(note_lower) for pat in _abbrev_patterns(abbrev_lower, strict=True)):
+            return state_code, None
     
-    # CHECK 3: City name lookup
-    sorted_cities = sorted(CITY_TO_STATE.keys(), key=len, reverse=True)
+    # CHECK 3: City name lookup (one scan of the note; longest mentioned city wins)
+    mentioned = set(_CITY_RE.findall(note_lower))
     
-    for city in sorted_cities:
-        if city in note_lower:
+    for city in _CITIES_BY_LENGTH:
+        if city in mentioned:
             mapped_state = CITY_TO_STATE[city]
             
             if mapped_state is None:
@@ -3327,15 +3974,7 @@ def validate_extracted_age(parsed_age, note_text):
     
     note_lower = note_text.lower()
     
-    age_patterns = [
-        r'\b\d{1,3}[\s\-]*(?:year|yr|y/?o|years?\s*old)\b',
-        r'\b(?:age|aged)\s*\d{1,3}\b',
-        r'\b\d{1,3}[\s\-]*(?:yo|y\.o\.)\b',
-        r'\b\d{1,3}\s*(?:f|m)\b',
-        r'\b(?:f|m)\s*\d{1,3}\b',
-    ]
-    
-    age_found = any(re.search(pattern, note_lower) for pattern in age_patterns)
+    age_found = any(pat.search(note_lower) for pat in _AGE_PATTERNS)
     
     if age_found:
         return parsed_age, None
@@ -3343,6 +3982,11 @@ def validate_extracted_age(parsed_age, note_text):
         return None, f"Cleared hallucinated age: {parsed_age}"
 
 
+# Note phrases that disambiguate Nurtec (rimegepant) acute vs preventive use
+_ACUTE_INDICATORS = ('prn', 'as needed', 'acute', 'rescue', 'abort', 'episodic migraine')
+_PREVENTIVE_INDICATORS = ('prevent', 'prophylaxis', 'daily', 'every other day', 'eod')
+
+
 def validate_parsed_data(parsed, note_text):
     """
     Unified post-processing validator for parse_clinical_note output.
@@ -3375,11 +4019,8 @@ def validate_parsed_data(parsed, note_text):
     nurtec_mentioned = any(term in note_lower for term in ['nurtec', 'rimegepant'])
     if nurtec_mentioned:
         # Check for acute indicators
-        acute_indicators = ['prn', 'as needed', 'acute', 'rescue', 'abort', 'episodic migraine']
-        preventive_indicators = ['prevent', 'prophylaxis', 'daily', 'every other day', 'eod']
-        
-        is_acute = any(term in note_lower for term in acute_indicators)
-        is_preventive = any(term in note_lower for term in preventive_indicators)
+        is_acute = any(term in note_lower for term in _ACUTE_INDICATORS)
+        is_preventive = any(term in note_lower for term in _PREVENTIVE_INDICATORS)
         
         if is_acute and not is_preventive:
             if parsed.get('drug_class') != 'Gepants (Acute)':
@@ -3431,35 +4072,18 @@ def validate_parsed_data(parsed, note_text):
     return parsed
 
 
-# Clinical note parser
-def parse_clinical_note(note_text, db_a, db_b):
-    """Parse clinical note using Claude API to extract structured data"""
-    import anthropic
-    
-    # Get API key from secrets (for deployed app) or environment
-    try:
-        api_key = st.secrets.get("ANTHROPIC_API_KEY", None)
-    except:
-        api_key = None
-    
-    if not api_key:
-        st.error("⚠️ Anthropic API key not configured. Add it to Streamlit secrets to enable note parsing.")
-        return None
-    
+# Fallback extractor for JSON wrapped in extra prose from the API
+_JSON_BLOCK_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+
+@st.cache_data(show_spinner=False)
+def _build_prompt_prefix(_db_a, _db_b):
+    """Build the static part of the parser prompt (everything before the note text)"""
     # Get valid options from databases
-    states = sorted(db_b['State'].unique().tolist())
-    payers = sorted(db_a['Payer_Name'].unique().tolist())[:50]  # Top 50 for context
-    drug_classes = sorted(db_b['Drug_Class'].unique().tolist())
+    payers = sorted(_db_a['Payer_Name'].unique().tolist())[:40]  # Top 40 for context
+    drug_classes = sorted(_db_b['Drug_Class'].unique().tolist())
     
-    try:
-        client = anthropic.Anthropic(api_key=api_key)
-        
-        message = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1024,
-            messages=[{
-                "role": "user",
-                "content": f"""Extract patient information from this clinical note. Return ONLY a JSON object.
+    return f"""Extract patient information from this clinical note. Return ONLY a JSON object.
 
 **STRICT EXTRACTION RULES - READ CAREFULLY:**
 
@@ -3534,7 +4158,7 @@ EXAMPLES:
   {{"name": "amitriptyline", "dose": "75mg", "duration_weeks": null, "reason_stopped": null}}
 
 Common payers in database:
-{', '.join(payers[:40])}
+{', '.join(payers)}
 
 Valid drug classes:
 {', '.join(drug_classes)}
@@ -3585,38 +4209,84 @@ The diagnosis MUST be based on headache FREQUENCY or clinician's stated diagnosi
 - Extract headache_days_per_month as a separate integer whenever frequency is mentioned
 
 Clinical note:
-{note_text}
+"""
+
+
+def _norm(text):
+    """Lowercase and collapse whitespace for case-insensitive name lookups"""
+    return ' '.join(text.lower().split())
+
+
+@st.cache_resource
+def _build_payer_lookup(_db_a):
+    """Map normalized payer names to their canonical registry spelling (shared; read-only)"""
+    lookup = {}
+    for p in _db_a['Payer_Name'].dropna().unique():
+        lookup.setdefault(_norm(p), p)
+    return lookup
+
+
+@st.cache_data(show_spinner=False)
+def match_payer_name(_db_a, payer_input):
+    """Canonical registry payer for a normalized name: exact match, else first substring match"""
+    payer_lookup = _build_payer_lookup(_db_a)
+    exact_match = payer_lookup.get(payer_input)
+    if exact_match:
+        return exact_match
+    # Check if input is contained in database name or vice versa
+    return next((p for p_norm, p in payer_lookup.items()
+                 if payer_input in p_norm or p_norm in payer_input), None)
+
+
+# Clinical note parser
+_PARSER_MODEL = "claude-sonnet-4-20250514"
+
+
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=128)
+def _request_note_parse(note_text, model, _api_key, _db_a, _db_b):
+    """Raw API response text for a note, cached per (note, model); API errors raise and are not cached"""
+    import anthropic
+    
+    client = anthropic.Anthropic(api_key=_api_key)
+    
+    message = client.messages.create(
+        model=model,
+        max_tokens=1024,
+        messages=[{
+            "role": "user",
+            "content": _build_prompt_prefix(_db_a, _db_b) + note_text + """
 
 Return ONLY the JSON object. Use null for ANY field where information is not explicitly stated in the note. Do NOT fabricate or assume information."""
-            }]
-        )
-        
-        # Extract JSON from response
-        response_text = message.content[0].text
-        
-        # Try to parse JSON
-        try:
+        }]
+    )
+    
+    return message.content[0].text
+
+
+def parse_clinical_note(note_text, db_a, db_b):
+    """Parse clinical note using Claude API to extract structured data"""
+    # Get API key from secrets (for deployed app) or environment
+    try:
+        api_key = st.secrets["ANTHROPIC_API_KEY"] if "ANTHROPIC_API_KEY" in st.secrets else None
+    except FileNotFoundError:
+        # No secrets.toml at all (local runs)
+        api_key = None
+    
+    if not api_key:
+        st.error("⚠️ Anthropic API key not configured. Add it to Streamlit secrets to enable note parsing.")
+        return None
+    
+    try:
+        # Extract JSON from response (repeat notes are served from cache)
+        response_text = _request_note_parse(note_text, _PARSER_MODEL, api_key, db_a, db_b)
+        
+        # Try to parse JSON
+        try:
             parsed = json.loads(response_text)
             
             # Validate and fuzzy-match payer name
             if parsed.get('payer'):
-                payer_input = parsed['payer'].lower().strip()
-                all_payers = db_a['Payer_Name'].unique()
-                
-                # Try exact match first (case insensitive)
-                exact_match = None
-                for p in all_payers:
-                    if p.lower() == payer_input:
-                        exact_match = p
-                        break
-                
-                # If no exact match, try partial matching
-                if not exact_match:
-                    for p in all_payers:
-                        # Check if input is contained in database name or vice versa
-                        if payer_input in p.lower() or p.lower() in payer_input:
-                            exact_match = p
-                            break
+                exact_match = match_payer_name(db_a, _norm(parsed['payer']))
                 
                 # Update with matched name
                 if exact_match:
@@ -3628,8 +4298,7 @@ Return ONLY the JSON object. Use null for ANY field where information is not exp
             return parsed
         except:
             # If not valid JSON, try to extract it
-            import re
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+            json_match = _JSON_BLOCK_RE.search(response_text)
             if json_match:
                 parsed = json.loads(json_match.group())
                 parsed = validate_parsed_data(parsed, note_text)
@@ -3645,58 +4314,8 @@ Return ONLY the JSON object. Use null for ANY field where information is not exp
 # ============================================================================
 # HIPAA ACKNOWLEDGMENT MODAL - Must acknowledge before using app
 # ============================================================================
-if 'hipaa_acknowledged' not in st.session_state:
-    st.session_state.hipaa_acknowledged = False
-
 if not st.session_state.hipaa_acknowledged:
-    st.markdown("""
-    <div style="background: linear-gradient(135deg, #4B0082 0%, #6A0DAD 100%); 
-                color: white; padding: 2rem; border-radius: 12px; margin-bottom: 1rem; text-align: center;">
-        <div style="font-size: 2rem; margin-bottom: 0.5rem; color: #FFFFFF;">💊 The Headache Vault</div>
-        <div style="font-size: 1rem; color: rgba(255,255,255,0.9);">Prior Authorization Automation Demo</div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    st.markdown("""
-    <div style="background: #FEF3C7; border: 2px solid #F59E0B; border-radius: 12px; padding: 1.5rem; margin: 1rem 0;">
-        <div style="display: flex; align-items: flex-start; gap: 12px;">
-            <span style="font-size: 32px;">⚠️</span>
-            <div>
-                <div style="font-size: 1.25rem; font-weight: 700; color: #92400E; margin-bottom: 0.75rem;">
-                    Important: Demo Environment — NOT HIPAA Compliant
-                </div>
-                <div style="color: #78350F; font-size: 0.95rem; line-height: 1.6;">
-                    <p style="margin-bottom: 0.75rem;">
-                        This demonstration application uses external AI services (Anthropic Claude) and cloud hosting 
-                        that have <strong>NOT been configured for HIPAA compliance</strong>.
-                    </p>
-                    <p style="margin-bottom: 0.75rem; font-weight: 600;">
-                        🚫 DO NOT ENTER any Protected Health Information (PHI):
-                    </p>
-                    <ul style="margin: 0.5rem 0 0.75rem 1.25rem; padding: 0;">
-                        <li>Patient names, dates of birth, or Social Security numbers</li>
-                        <li>Medical record numbers or insurance member IDs</li>
-                        <li>Specific dates of service or appointment dates</li>
-                        <li>Addresses, phone numbers, or email addresses</li>
-                    </ul>
-                    <p style="margin-bottom: 0;">
-                        ✅ <strong>Safe to use:</strong> Age (not DOB), gender, state, insurance company name, 
-                        diagnosis codes, medication names/doses, and de-identified treatment history.
-                    </p>
-                </div>
-            </div>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    st.markdown("""
-    <div style="background: #F3F4F6; border-radius: 8px; padding: 1rem; margin: 1rem 0; font-size: 0.85rem; color: #4B5563;">
-        <strong>About this Demo:</strong> The Headache Vault PA Engine demonstrates automated prior authorization 
-        workflows for headache medications. Use sample data or fully de-identified scenarios only.
-        <br><br>
-        <strong>Production Version:</strong> A HIPAA-compliant production version with BAA coverage is planned for August 2026.
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(_HIPAA_GATE_HTML, unsafe_allow_html=True)
     
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
@@ -3709,493 +4328,212 @@ if not st.session_state.hipaa_acknowledged:
 # ============================================================================
 # GLOBAL HIPAA WARNING BANNER - Persistent at top of every page
 # ============================================================================
-st.markdown("""
-<div style="background: linear-gradient(90deg, #DC2626 0%, #B91C1C 100%); 
-            color: white; 
-            padding: 10px 16px; 
-            border-radius: 8px; 
-            margin-bottom: 16px;
-            display: flex;
-            align-items: center;
-            gap: 10px;
-            font-size: 0.9rem;">
-    <span style="font-size: 20px;">⚠️</span>
-    <div>
-        <strong>DEMO ENVIRONMENT — NOT HIPAA COMPLIANT</strong>
-        <span style="opacity: 0.9; margin-left: 8px;">
-            Do NOT enter real patient information. Use de-identified or sample data only.
-        </span>
-    </div>
-</div>
-""", unsafe_allow_html=True)
+@st.fragment
+def _render_page_chrome():
+    """Banner, title and home button; a no-op home click reruns only this fragment."""
+    st.markdown(_GLOBAL_BANNER_HTML, unsafe_allow_html=True)
+    
+    # Header with title - using columns to add home button inline
+    title_col1, title_col2 = st.columns([9, 1])
+    with title_col1:
+        st.markdown(_TITLE_HTML, unsafe_allow_html=True)
+    with title_col2:
+        if st.button("🏠", key="home_btn", help="Return to Dashboard"):
+            ss = st.session_state
+            # Already home with nothing to clear: nothing outside the fragment needs redrawing
+            if ss.current_page != 'Dashboard' or ss.search_results is not None or ss.show_pa_text:
+                ss.current_page = 'Dashboard'
+                ss.search_results = None
+                ss.show_pa_text = False
+                st.rerun()
 
-# Header with title - using columns to add home button inline
-title_col1, title_col2 = st.columns([9, 1])
-with title_col1:
-    st.markdown("""
-    <div style="text-align: left; margin-bottom: 1rem;">
-        <div class="main-header">The Headache Vault</div>
-        <div class="sub-header">Prior Authorization Automation for Headache Medicine</div>
-        <div style="color: #262730; font-size: 0.95rem; font-weight: 400; font-family: 'Source Sans Pro', sans-serif;">
-            Infrastructure to Scale Specialist-Level Care
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
-with title_col2:
-    if st.button("🏠", key="home_btn", help="Return to Dashboard"):
-        st.session_state.current_page = 'Dashboard'
-        st.session_state.search_results = None
-        st.session_state.show_pa_text = False
-        st.rerun()
+_render_page_chrome()
 
 # ============================================================================
 # PERSONA TOGGLE - Experience Mode Selector
 # ============================================================================
 toggle_col1, toggle_col2, toggle_col3 = st.columns([3, 6, 3])
 with toggle_col2:
-    mode_options = {
-        'pcp': '👨‍⚕️ PCP / New to CGRPs (Show Guidance)',
-        'specialist': '⚡ Specialist (Fast Mode)'
-    }
-    
     # Create the toggle using radio buttons styled as a toggle
-    selected_mode = st.radio(
-        "Experience Level",
-        options=['pcp', 'specialist'],
-        format_func=lambda x: mode_options[x],
-        horizontal=True,
-        label_visibility="collapsed",
-        key="mode_selector"
-    )
-    
-    # Update session state if changed
-    if selected_mode != st.session_state.user_mode:
-        st.session_state.user_mode = selected_mode
-        st.rerun()
-
-# Show mode indicator
-if st.session_state.user_mode == 'pcp':
-    st.markdown("""
-    <div style="text-align: center; margin: 0.5rem 0 1rem 0;">
-        <span style="background: #F0FFF4; color: #276749; padding: 0.35rem 0.75rem; border-radius: 20px; font-size: 0.8rem; font-weight: 500;">
-            📘 Guidance Mode Active — Tips and learning moments will appear throughout
-        </span>
-    </div>
-    """, unsafe_allow_html=True)
-else:
-    st.markdown("""
-    <div style="text-align: center; margin: 0.5rem 0 1rem 0;">
-        <span style="background: #EBF8FF; color: #2B6CB0; padding: 0.35rem 0.75rem; border-radius: 20px; font-size: 0.8rem; font-weight: 500;">
-            ⚡ Fast Mode Active — Clean data, no interruptions
-        </span>
-    </div>
-    """, unsafe_allow_html=True)
-
-# Page Navigation
-col1, col2, col3, col4, col5 = st.columns([2,2,2,2,6])
-with col1:
-    if st.button("📊 Dashboard", use_container_width=True, type="primary" if st.session_state.current_page == 'Dashboard' else "secondary"):
-        st.session_state.current_page = 'Dashboard'
-        st.rerun()
-with col2:
-    if st.button("🔍 Search", use_container_width=True, type="primary" if st.session_state.current_page == 'Search' else "secondary"):
-        st.session_state.current_page = 'Search'
-        st.rerun()
-with col3:
-    if st.button("📋 Paste Notes", use_container_width=True, type="primary" if st.session_state.current_page == 'Paste Notes' else "secondary"):
-        st.session_state.current_page = 'Paste Notes'
-        st.rerun()
-
-st.markdown("---")
-
-# ============================================================================
-# DASHBOARD PAGE
-# ============================================================================
-if st.session_state.current_page == 'Dashboard':
-    
-    # Hero Stats
-    st.markdown("### 📊 Coverage Statistics")
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.markdown("""
-        <div class="stat-card" style="background: linear-gradient(135deg, #4B0082 0%, #6A0DAD 100%); padding: 1.5rem; border-radius: 12px; text-align: center; box-shadow: 0 4px 6px rgba(75, 0, 130, 0.3);">
-            <div class="stat-number" style="font-size: 2.75rem; font-weight: 800; margin: 0;"><span style="color: #FFFFFF !important; text-shadow: 1px 1px 3px rgba(0,0,0,0.4);">752</span></div>
-            <div class="stat-label" style="font-size: 1rem; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; margin-top: 0.5rem;"><span style="color: #E6E6FA !important; text-shadow: 1px 1px 2px rgba(0,0,0,0.3);">Payer Policies</span></div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown("""
-        <div class="stat-card" style="background: linear-gradient(135deg, #4B0082 0%, #6A0DAD 100%); padding: 1.5rem; border-radius: 12px; text-align: center; box-shadow: 0 4px 6px rgba(75, 0, 130, 0.3);">
-            <div class="stat-number" style="font-size: 2.75rem; font-weight: 800; margin: 0;"><span style="color: #FFFFFF !important; text-shadow: 1px 1px 3px rgba(0,0,0,0.4);">1,088</span></div>
-            <div class="stat-label" style="font-size: 1rem; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; margin-top: 0.5rem;"><span style="color: #E6E6FA !important; text-shadow: 1px 1px 2px rgba(0,0,0,0.3);">Payers Covered</span></div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown("""
-        <div class="stat-card" style="background: linear-gradient(135deg, #4B0082 0%, #6A0DAD 100%); padding: 1.5rem; border-radius: 12px; text-align: center; box-shadow: 0 4px 6px rgba(75, 0, 130, 0.3);">
-            <div class="stat-number" style="font-size: 2.75rem; font-weight: 800; margin: 0;"><span style="color: #FFFFFF !important; text-shadow: 1px 1px 3px rgba(0,0,0,0.4);">50</span></div>
-            <div class="stat-label" style="font-size: 1rem; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; margin-top: 0.5rem;"><span style="color: #E6E6FA !important; text-shadow: 1px 1px 2px rgba(0,0,0,0.3);">States</span></div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col4:
-        st.markdown("""
-        <div class="stat-card" style="background: linear-gradient(135deg, #4B0082 0%, #6A0DAD 100%); padding: 1.5rem; border-radius: 12px; text-align: center; box-shadow: 0 4px 6px rgba(75, 0, 130, 0.3);">
-            <div class="stat-number" style="font-size: 2.75rem; font-weight: 800; margin: 0;"><span style="color: #FFFFFF !important; text-shadow: 1px 1px 3px rgba(0,0,0,0.4);">8</span></div>
-            <div class="stat-label" style="font-size: 1rem; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; margin-top: 0.5rem;"><span style="color: #E6E6FA !important; text-shadow: 1px 1px 2px rgba(0,0,0,0.3);">Drug Classes</span></div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    st.markdown("<br>", unsafe_allow_html=True)
-    
-    # What's New Banner
-    st.info("🎉 **What's New:** AI Clinical Note Parsing now available! Parse unstructured notes in seconds.")
-    
-    # System Status
-    st.markdown("<br>", unsafe_allow_html=True)
-    st.markdown("### 🔧 System Status")
-    
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.success("🟢 **All Systems Operational**")
-    with col2:
-        st.info("⚡ **Response Time:** <2 seconds")
-    with col3:
-        st.info("📅 **Last Updated:** January 15, 2026")
-    
-    # Feature Highlights
-    st.markdown("<br>", unsafe_allow_html=True)
-    st.markdown("### ✨ Platform Features")
-    
-    feature_col1, feature_col2 = st.columns(2)
-    
-    with feature_col1:
-        st.markdown("""
-        **Core Capabilities:**
-        - ⚡ 2-second PA policy lookups
-        - 🤖 AI-powered clinical note parsing  
-        - 📋 One-click appeal templates
-        - 🏆 Gold Card status tracking
-        - 📊 Step therapy requirements
-        - 🔍 ICD-10 code lookup
-        """)
-    
-    with feature_col2:
-        st.markdown("""
-        **Clinical Intelligence:**
-        - ✅ AHS 2021/2024 Guidelines
-        - ✅ ACP 2025 Guidelines
-        - ✅ ICHD-3 Diagnostic Criteria
-        - ✅ MOH Risk Screening
-        - ✅ Pediatric Age Checks
-        - ✅ State Regulatory Framework
-        """)
-
-# ============================================================================
-# SEARCH PAGE
-# ============================================================================
-elif st.session_state.current_page == 'Search':
-    
-    # ========================================================================
-    # PA TEXT GENERATOR - Show at TOP when active
-    # ========================================================================
-    if st.session_state.show_pa_text and st.session_state.search_results is not None:
-        results = st.session_state.search_results
-        if len(results) > 0:
-            row = results.iloc[0]
-            
-            # Get values safely
-            headache_type = st.session_state.get('headache_type', 'Chronic Migraine')
-            diag = st.session_state.parsed_data.get('diagnosis', headache_type) if 'parsed_data' in st.session_state else headache_type
-            age = st.session_state.get('patient_age')
-            if age is None:
-                age = 35  # Default adult age if not specified
-            drug = st.session_state.get('selected_drug', row['Drug_Class'])
-            state = row['State']
-            
-            # Check if pediatric patient
-            is_pediatric = age < 18
-            
-            # Get parsed prior medications if available
-            prior_meds = []
-            if 'parsed_data' in st.session_state and st.session_state.parsed_data.get('prior_medications'):
-                prior_meds = st.session_state.parsed_data.get('prior_medications', [])
-            
-            st.markdown("### 📝 Prior Authorization Documentation")
-            
-            # Close button to dismiss PA
-            if st.button("✕ Close PA Letter", key="close_pa"):
-                st.session_state.show_pa_text = False
-                st.rerun()
-            
-            # Show pediatric alert if applicable
-            if is_pediatric:
-                st.warning(f"⚠️ **Pediatric Patient (Age {age})** — FDA approval and dosing considerations included in PA letter.")
-            
-            # Determine ICD-10 code based on diagnosis
-            icd10_codes = {
-                'Chronic Migraine': 'G43.709',
-                'Episodic Migraine': 'G43.009', 
-                'Cluster Headache': 'G44.009'
-            }
-            icd10_code = icd10_codes.get(diag, 'G43.709')
-            
-            if st.session_state.user_mode == 'pcp':
-                st.markdown("""
-                <div class="learning-moment">
-                    <div class="learning-moment-title">💡 PA Documentation Tips</div>
-                    <div class="learning-moment-content">
-                        <strong>Keys to approval:</strong> Be specific about medication names, exact dosages, 
-                        trial durations with dates, and clear failure reasons. Vague language like 
-                        "tried several medications" or "adequate trial" often leads to denials.
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Build pediatric section if needed
-                pediatric_section = ""
-                if is_pediatric:
-                    pediatric_section = f"""
-PEDIATRIC CONSIDERATIONS
-────────────────────────
-Patient Age: {age} years (Pediatric)
-
-FDA-Approved CGRP Medications for Pediatric Migraine Prevention:
-• Aimovig (erenumab): Approved for ages 12+ for migraine prevention
-• Ajovy (fremanezumab): Approved for ages 12+ for migraine prevention  
-• Emgality (galcanezumab): Approved for ages 12+ for migraine prevention
-
-Dosing: Standard adult dosing is appropriate for patients ≥12 years.
-
-This patient meets age criteria for FDA-approved CGRP therapy.
-
-"""
-                
-                pa_text = f"""══════════════════════════════════════════════════════════════
-              PRIOR AUTHORIZATION REQUEST - {drug.upper()}
-              Generated: {datetime.now().strftime('%B %d, %Y')}
-══════════════════════════════════════════════════════════════
-
-PATIENT INFORMATION
-───────────────────
-Diagnosis: {diag}
-ICD-10 Code: {icd10_code}
-Patient Age: {age} years{" (PEDIATRIC)" if is_pediatric else ""}
-{pediatric_section}
-REQUESTED MEDICATION
-────────────────────
-Drug Class: {drug}
-Payer: {row['Payer_Name']}
-Line of Business: {row['LOB']}
-State: {state}
-
-"""
-                # Inject formulary status into PCP PA letter
-                _pa_vault_id = row.get('Vault_Payer_ID', '')
-                _pa_drug_cls = row.get('Drug_Class', '')
-                _pa_sel_drug = extract_selected_drug_name(st.session_state.get('patient_context', {}) or {})
-                if _pa_vault_id and _pa_drug_cls and not formulary_tier_map.empty:
-                    _pa_tier = lookup_formulary_for_policy(formulary_tier_map, _pa_vault_id, _pa_drug_cls)
-                    if not _pa_tier.empty:
-                        pa_text += "FORMULARY STATUS\n────────────────\n"
-                        if _pa_sel_drug:
-                            _sel_rows = _pa_tier[_pa_tier['Drug_Name'] == _pa_sel_drug]
-                            if not _sel_rows.empty:
-                                _s = _sel_rows.iloc[0]
-                                _st_val = _s.get('Formulary_Status', 'Unknown')
-                                _t_val = _s.get('Tier', '—')
-                                pa_text += f"Requested Drug: {_pa_sel_drug} ({_st_val}, {_t_val})\n"
-                                if _st_val in ('Non-Preferred', 'Restricted', 'Excluded'):
-                                    _pref = _pa_tier[_pa_tier['Formulary_Status'] == 'Preferred']
-                                    if not _pref.empty:
-                                        _alt = _pref.iloc[0]
-                                        pa_text += f"Preferred Alternative: {_alt['Drug_Name']} ({_alt.get('Tier', '—')})\n"
-                                    pa_text += "\nClinical justification for non-preferred agent:\n"
-                                    pa_text += "• [Patient has failed/is intolerant to preferred agent]\n"
-                                    pa_text += "• [Specific clinical reason for this drug over preferred]\n"
-                        else:
-                            for _, _fr in _pa_tier.iterrows():
-                                pa_text += f"  {_fr.get('Drug_Name','?')}: {_fr.get('Formulary_Status','?')} ({_fr.get('Tier','—')})\n"
-                        pa_text += "\n"
-
-                if row['Step_Therapy_Required'] == 'Yes':
-                    step_req = row.get('Step_1_Requirement', 'Prior oral preventive trials required')
-                    step_dur = row.get('Step_1_Duration', 'Per policy requirements')
-                    pa_text += f"""STEP THERAPY REQUIREMENTS
-─────────────────────────
-Policy Requirement: {step_req}
-Required Duration: {step_dur}
-
-"""
-                    # Check for enriched medication trial data first
-                    # Use selected_policy_idx from session state, default to 0
-                    policy_idx = st.session_state.get('selected_policy_idx', 0)
-                    session_key = f"medication_trials_{policy_idx}"
-                    if session_key in st.session_state and st.session_state[session_key]:
-                        medication_trials = st.session_state[session_key]
-                        pa_text += """DOCUMENTED PRIOR MEDICATION TRIALS
-──────────────────────────────────
-"""
-                        for i, trial in enumerate(medication_trials, 1):
-                            # Format each trial with available details
-                            trial_line = f"  {i}. {trial.medication_name}"
-                            if trial.drug_class:
-                                trial_line += f" ({trial.drug_class})"
-                            pa_text += trial_line + "\n"
-                            
-                            details = []
-                            if trial.dose:
-                                details.append(f"Dose: {trial.dose}")
-                            if trial.duration_weeks:
-                                details.append(f"Duration: {trial.duration_weeks} weeks")
-                            if trial.reason_stopped:
-                                details.append(f"Discontinued: {trial.reason_stopped}")
-                            
-                            if details:
-                                pa_text += f"     → {' | '.join(details)}\n"
-                            pa_text += "\n"
-                        
-                        pa_text += """  ✓ Patient has completed required step therapy trials as documented above.
-
-"""
-                    # Fall back to simple medication list if no enriched data
-                    elif prior_meds:
-                        pa_text += """DOCUMENTED PRIOR MEDICATION TRIALS
-──────────────────────────────────
-"""
-                        for i, med in enumerate(prior_meds, 1):
-                            # Handle both string and dict formats
-                            if isinstance(med, str):
-                                med_line = med
-                            elif isinstance(med, dict):
-                                med_line = med.get('name', 'Unknown')
-                                details = []
-                                if med.get('dose'):
-                                    details.append(med['dose'])
-                                if med.get('duration_weeks'):
-                                    details.append(f"{med['duration_weeks']} weeks")
-                                if med.get('reason_stopped'):
-                                    details.append(f"D/C: {med['reason_stopped']}")
-                                if details:
-                                    med_line += f" - {', '.join(details)}"
-                            else:
-                                med_line = str(med)
-                            pa_text += f"  {i}. {med_line}\n"
-                        pa_text += """
-  ✓ Patient has completed required step therapy trials as documented above.
+    selected_mode = st.radio(
+        "Experience Level",
+        options=tuple(_MODE_OPTIONS),
+        format_func=_MODE_OPTIONS.__getitem__,
+        horizontal=True,
+        label_visibility="collapsed",
+        key="mode_selector"
+    )
+    
+    # Update session state if changed
+    if selected_mode != st.session_state.user_mode:
+        st.session_state.user_mode = selected_mode
+        st.rerun()
 
-"""
-                    else:
-                        pa_text += """PRIOR MEDICATION TRIALS
-───────────────────────
-  [Document each failed medication with:]
-  • Drug name and maximum dose reached
-  • Start and end dates (minimum 8 weeks)
-  • Specific reason for discontinuation
+# Show mode indicator
+st.markdown(_MODE_BADGE_HTML[st.session_state.user_mode], unsafe_allow_html=True)
 
-"""
-                pa_text += f"""
-CLINICAL RATIONALE
-──────────────────
-Patient has documented history of {diag} with inadequate response 
-to conventional preventive therapies. {drug} is medically necessary 
-due to:
-• Failure/intolerance of prior preventive medications as documented above
-• Significant impact on daily functioning and quality of life
-• No contraindications to requested therapy
+# Page Navigation
+_PAGE_LABELS = {
+    'Dashboard': '📊 Dashboard',
+    'Search': '🔍 Search',
+    'Paste Notes': '📋 Paste Notes'
+}
 
-REFERENCES
-──────────
-This request aligns with:
-• American Headache Society Consensus Statement (2021)
-• ICHD-3 Diagnostic Criteria
-• AAN/AHS Practice Guidelines
+def _on_nav_change():
+    """Copy the nav selection into current_page (ignores deselect clicks)"""
+    if st.session_state.nav_page:
+        st.session_state.current_page = st.session_state.nav_page
+
+# Keep the control in sync with pages set elsewhere (home button, search handoff)
+st.session_state.nav_page = st.session_state.current_page
+st.segmented_control(
+    "Page",
+    options=list(_PAGE_LABELS),
+    format_func=_PAGE_LABELS.get,
+    key="nav_page",
+    on_change=_on_nav_change,
+    label_visibility="collapsed"
+)
 
-══════════════════════════════════════════════════════════════
-"""
-            else:
-                # Specialist compact mode
-                pediatric_note = " [PEDIATRIC - FDA approved 12+]" if is_pediatric else ""
-                pa_text = f"""PRIOR AUTHORIZATION REQUEST
-{datetime.now().strftime('%Y-%m-%d')} | {row['Payer_Name']} | {state}
+st.markdown("---")
 
-Dx: {diag} ({icd10_code})
-Age: {age}y{pediatric_note}
-Rx: {drug} ({row['Medication_Category']})
-LOB: {row['LOB']}
-"""
-                # Inject compact formulary status for specialist mode
-                if _pa_vault_id and _pa_drug_cls and not formulary_tier_map.empty:
-                    _sp_tier = lookup_formulary_for_policy(formulary_tier_map, _pa_vault_id, _pa_drug_cls)
-                    if not _sp_tier.empty and _pa_sel_drug:
-                        _sp_sel = _sp_tier[_sp_tier['Drug_Name'] == _pa_sel_drug]
-                        if not _sp_sel.empty:
-                            _sp_s = _sp_sel.iloc[0]
-                            pa_text += f"Formulary: {_pa_sel_drug} → {_sp_s.get('Formulary_Status','?')} ({_sp_s.get('Tier','—')})\n"
+# ============================================================================
+# DASHBOARD PAGE
+# ============================================================================
+if st.session_state.current_page == 'Dashboard':
+    
+    # Hero Stats
+    st.markdown("### 📊 Coverage Statistics")
+    st.markdown(_STATS_ROW_HTML, unsafe_allow_html=True)
+    
+    st.markdown("<br>", unsafe_allow_html=True)
+    
+    # What's New Banner
+    st.info("🎉 **What's New:** AI Clinical Note Parsing now available! Parse unstructured notes in seconds.")
+    
+    # System Status
+    st.markdown("<br>", unsafe_allow_html=True)
+    st.markdown("### 🔧 System Status")
+    
+    st.markdown(_SYSTEM_STATUS_HTML, unsafe_allow_html=True)
+    
+    # Feature Highlights
+    st.markdown("<br>", unsafe_allow_html=True)
+    st.markdown("### ✨ Platform Features")
+    
+    feature_col1, feature_col2 = st.columns(2)
+    
+    with feature_col1:
+        st.markdown("""
+        **Core Capabilities:**
+        - ⚡ 2-second PA policy lookups
+        - 🤖 AI-powered clinical note parsing  
+        - 📋 One-click appeal templates
+        - 🏆 Gold Card status tracking
+        - 📊 Step therapy requirements
+        - 🔍 ICD-10 code lookup
+        """)
+    
+    with feature_col2:
+        st.markdown("""
+        **Clinical Intelligence:**
+        - ✅ AHS 2021/2024 Guidelines
+        - ✅ ACP 2025 Guidelines
+        - ✅ ICHD-3 Diagnostic Criteria
+        - ✅ MOH Risk Screening
+        - ✅ Pediatric Age Checks
+        - ✅ State Regulatory Framework
+        """)
 
-                if row['Step_Therapy_Required'] == 'Yes':
-                    step_req = row.get('Step_1_Requirement', 'Prior preventive')
-                    step_dur = row.get('Step_1_Duration', 'Per policy')
-                    pa_text += f"""
-Step Therapy: REQUIRED ({step_req}, {step_dur})
-"""
-                    # Add prior meds in compact format
-                    if prior_meds:
-                        pa_text += "Prior Trials:\n"
-                        for med in prior_meds:
-                            # Handle both string and dict formats
-                            if isinstance(med, str):
-                                med_line = med
-                            elif isinstance(med, dict):
-                                med_line = med.get('name', 'Unknown')
-                                if med.get('dose'):
-                                    med_line += f" {med['dose']}"
-                                if med.get('duration_weeks'):
-                                    med_line += f" x{med['duration_weeks']}wk"
-                                if med.get('reason_stopped'):
-                                    med_line += f" → {med['reason_stopped']}"
-                            else:
-                                med_line = str(med)
-                            pa_text += f"  • {med_line}\n"
-                    pa_text += "Status: Step therapy completed\n"
-                else:
-                    pa_text += "\nStep Therapy: Not required\n"
-                
-                pa_text += "\nRefs: AHS 2024, ICHD-3, AAN Guidelines"
-            
-            st.code(pa_text, language=None)
-            
-            # Store PA text and context for email functionality
-            st.session_state.pa_text_for_email = pa_text
-            st.session_state.pa_email_context = {
-                'drug': drug,
-                'payer': row['Payer_Name'],
-                'state': state,
-                'diagnosis': diag
-            }
-            
-            # Action buttons row
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                if st.button("📋 Copy to Clipboard", key="copy_pa", use_container_width=True):
-                    st.toast("✅ PA text copied!", icon="✅")
-            with col2:
-                if st.button("📧 Email to Me", key="email_pa", use_container_width=True):
-                    st.session_state.show_email_form = True
-                    st.rerun()
-            with col3:
-                if st.button("🔙 Back to Results", key="back_to_results", use_container_width=True):
-                    st.session_state.show_pa_text = False
-                    st.rerun()
-            
-            # Show email form if requested
-            if st.session_state.get('show_email_form', False):
-                show_email_modal()
-            
-            st.markdown("---")
+# ============================================================================
+# SEARCH PAGE
+# ============================================================================
+elif st.session_state.current_page == 'Search':
+    
+    # ========================================================================
+    # PA TEXT GENERATOR - Show at TOP when active
+    # ========================================================================
+    ss = st.session_state  # bound once for the PA section
+    # Only build the letter once a policy card's "Generate PA Letter" has picked a row
+    if (ss.show_pa_text and ss.search_results is not None
+            and ss.get('selected_policy_idx') in ss.search_results.index):
+        results = ss.search_results
+        row = results.loc[ss.selected_policy_idx]
+        
+        # Get values safely
+        headache_type = ss.get('headache_type', 'Chronic Migraine')
+        diag = ss.parsed_data.get('diagnosis', headache_type) if 'parsed_data' in ss else headache_type
+        age = ss.get('patient_age')
+        if age is None:
+            age = 35  # Default adult age if not specified
+        drug = ss.get('selected_drug', row['Drug_Class'])
+        state = row['State']
+        
+        # Check if pediatric patient
+        is_pediatric = age < 18
+        
+        # Get parsed prior medications if available
+        prior_meds = []
+        if 'parsed_data' in ss and ss.parsed_data.get('prior_medications'):
+            prior_meds = ss.parsed_data.get('prior_medications', [])
+        
+        st.markdown("### 📝 Prior Authorization Documentation")
+        
+        # Close button to dismiss PA
+        if st.button("✕ Close PA Letter", key="close_pa"):
+            ss.show_pa_text = False
+            st.rerun()
+        
+        # Show pediatric alert if applicable
+        if is_pediatric:
+            st.warning(f"⚠️ **Pediatric Patient (Age {age})** — FDA approval and dosing considerations included in PA letter.")
+        
+        if ss.user_mode == 'pcp':
+            st.markdown(_PA_TIPS_HTML, unsafe_allow_html=True)
+        
+        # Enriched medication trials collected for the selected policy
+        medication_trials = ss.get(f"medication_trials_{ss.selected_policy_idx}")
+        pa_text = build_pa_text(
+            policy_row_key(row), diag, age, drug, ss.user_mode, prior_meds, medication_trials,
+            extract_selected_drug_name(ss.get('patient_context', {}) or {}),
+            datetime.now().date(), row, vault_db.formulary_by_payer_id
+        )
+        st.code(pa_text, language=None)
+        
+        # Store PA text and context for email functionality
+        ss.pa_text_for_email = pa_text
+        ss.pa_email_context = {
+            'drug': drug,
+            'payer': row['Payer_Name'],
+            'state': state,
+            'diagnosis': diag
+        }
+        
+        # Action buttons row (copying is handled by st.code's built-in copy icon)
+        col1, col2, col3 = st.columns([1, 1, 1], gap="small")
+        with col1:
+            st.download_button(
+                label="📥 Download as TXT",
+                data=pa_text,
+                file_name=_pa_filename(row['Payer_Name'], time.strftime('%Y%m%d')),
+                mime="text/plain",
+                key="download_pa",
+                use_container_width=True
+            )
+        with col2:
+            if st.button("📧 Email to Me", key="email_pa", use_container_width=True):
+                ss.show_email_form = True
+                st.rerun()
+        with col3:
+            if st.button("🔙 Back to Results", key="back_to_results", use_container_width=True):
+                ss.show_pa_text = False
+                st.rerun()
+        
+        # Show email form if requested
+        if ss.get('show_email_form', False):
+            show_email_modal()
+        
+        st.markdown("---")
     
     # ========================================================================
     # SEARCH PAGE CONTENT
@@ -4219,21 +4557,21 @@ Step Therapy: REQUIRED ({step_req}, {step_dur})
 """, unsafe_allow_html=True)
 
     # State selection - add placeholder if state not detected
-    states = sorted(db_b['State'].unique().tolist())
+    states = states_sorted()
     ctx = SessionStateManager.get_context()
     
     # If state not specified, show placeholder option
     if ctx.state is None:
         state_options = ["-- Please Select State --"] + states
-        state_index = 0  # Start on placeholder
+        state_option_idx = 0  # Start on placeholder
     else:
         state_options = states
-        state_index = states.index(ctx.state) if ctx.state in states else 0
+        state_option_idx = state_to_idx().get(ctx.state, 0)
     
     selected_state = st.sidebar.selectbox(
         "State",
         options=state_options,
-        index=state_index,
+        index=state_option_idx,
         key="sidebar_state"
     )
     
@@ -4246,76 +4584,79 @@ Step Therapy: REQUIRED ({step_req}, {step_dur})
         state_drug_classes = ['CGRP mAbs (SC)']  # Default option
     else:
         # Payer selection based on selected state
-        state_payers = db_b[db_b['State'] == selected_state]['Payer_Name'].unique().tolist()
-        payer_options = ['All Payers'] + sorted(state_payers)
+        payer_options = ['All Payers'] + payers_for_state(selected_state)
         # Drug class selection based on selected state
-        state_drug_classes = sorted(db_b[db_b['State'] == selected_state]['Drug_Class'].unique().tolist())
-    
-    selected_payer = st.sidebar.selectbox(
-        "Payer", 
-        options=payer_options,
-        index=SidebarHelper.get_payer_index(payer_options) if not state_not_selected else 0,
-        key="sidebar_payer",
-        disabled=state_not_selected
-    )
+        state_drug_classes = drug_classes_for_state(selected_state)
+    
+    # Payer/drug/type/age are batched in a form so edits don't rerun the page until
+    # Search is clicked. State stays outside because it drives the option lists above.
+    with st.sidebar.form("search_filters", border=False):
+        selected_payer = st.selectbox(
+            "Payer", 
+            options=payer_options,
+            index=SidebarHelper.get_payer_index(payer_options) if not state_not_selected else 0,
+            key="sidebar_payer",
+            disabled=state_not_selected
+        )
     
-    # Sync matched_payer with current dropdown to prevent stale values from Clinical Tools extraction
-    if selected_payer == 'All Payers':
-        st.session_state.matched_payer = None
-    
-    selected_drug = st.sidebar.selectbox(
-        "Medication Class",
-        options=state_drug_classes if state_drug_classes else ['CGRP mAbs (SC)'],
-        index=SidebarHelper.get_drug_index(state_drug_classes) if not state_not_selected and state_drug_classes else 0,
-        help=f"{len(state_drug_classes)} drug classes available" if not state_not_selected else "Select state first",
-        key="sidebar_drug",
-        disabled=state_not_selected
-    )
+        # Sync matched_payer with current dropdown to prevent stale values from Clinical Tools extraction
+        if selected_payer == 'All Payers':
+            st.session_state.matched_payer = None
+    
+        selected_drug = st.selectbox(
+            "Medication Class",
+            options=state_drug_classes if state_drug_classes else ['CGRP mAbs (SC)'],
+            index=SidebarHelper.get_drug_index(state_drug_classes) if not state_not_selected and state_drug_classes else 0,
+            help=f"{len(state_drug_classes)} drug classes available" if not state_not_selected else "Select state first",
+            key="sidebar_drug",
+            disabled=state_not_selected
+        )
     
-    # Headache type
-    headache_options = ["Chronic Migraine", "Episodic Migraine", "Cluster Headache"]
-    headache_type = st.sidebar.radio(
-        "Headache Type",
-        options=headache_options,
-        index=SidebarHelper.get_headache_index(headache_options),
-        key="sidebar_headache"
-    )
+        # Headache type
+        headache_options = ["Chronic Migraine", "Episodic Migraine", "Cluster Headache"]
+        headache_type = st.radio(
+            "Headache Type",
+            options=headache_options,
+            index=SidebarHelper.get_headache_index(headache_options),
+            key="sidebar_headache"
+        )
 
-    # Patient age (from PatientContext) - use 40 as neutral default if not specified
-    ctx = SessionStateManager.get_context()
-    age_value = ctx.age if ctx.age is not None else 40
-    patient_age = st.sidebar.number_input(
-        "Patient Age (years)",
-        min_value=1,
-        max_value=120,
-        value=age_value,
-        help="Used to check pediatric prescribing restrictions" + (" (not detected - please verify)" if ctx.age is None else ""),
-        key="sidebar_age"
-    )
-    # Search button
-    st.sidebar.markdown("---")
+        # Patient age (from PatientContext) - use 40 as neutral default if not specified
+        ctx = SessionStateManager.get_context()
+        age_value = ctx.age if ctx.age is not None else 40
+        patient_age = st.number_input(
+            "Patient Age (years)",
+            min_value=1,
+            max_value=120,
+            value=age_value,
+            help="Used to check pediatric prescribing restrictions" + (" (not detected - please verify)" if ctx.age is None else ""),
+            key="sidebar_age"
+        )
+        # Search button
+        st.markdown("---")
 
-    # Show quick stats
-    total_in_state = len(db_b[db_b['State'] == selected_state])
-    st.sidebar.markdown(f"""
+        # Show quick stats
+        total_in_state = 0 if state_not_selected else len(policies_by_state[selected_state])
+        st.markdown(f"""
 <div style='background-color: white; padding: 0.75rem; border-radius: 8px; border-left: 4px solid #4B0082; margin: 0.5rem 0;'>
     <div style='color: #262730; font-weight: 600;'>📊 {total_in_state} policies in {selected_state}</div>
 </div>
 """, unsafe_allow_html=True)
 
-    # Database coverage note
-    st.sidebar.markdown("""
+        # Database coverage note
+        st.markdown("""
 <div style='color: #5A5A5A; font-size: 0.85rem; margin-top: 0.5rem; font-style: italic;'>
     💡 Database: 915 policies across 50 states. Coverage expanding weekly.
 </div>
 """, unsafe_allow_html=True)
 
-    # Search button - disabled if state not selected
-    if state_not_selected:
-        st.sidebar.button("🔎 Search Policies", type="primary", use_container_width=True, disabled=True)
-        search_clicked = False
-    else:
-        search_clicked = st.sidebar.button("🔎 Search Policies", type="primary", use_container_width=True)
+        # Search button - disabled if state not selected
+        search_clicked = st.form_submit_button(
+            "🔎 Search Policies",
+            type="primary",
+            use_container_width=True,
+            disabled=state_not_selected
+        )
 
     # Main content area - show results from either search method
     # But DON'T show results if state hasn't been selected yet
@@ -4405,30 +4746,26 @@ Step Therapy: REQUIRED ({step_req}, {step_dur})
 """, unsafe_allow_html=True)
                 botox_warning_shown = True  # Reuse flag to suppress generic no-results message
             
-            # Perform search with national fallback support
-            query, fallback_used, fallback_message = search_policies_with_fallback(
+            # Perform search with national fallback support, filtered by headache type
+            query, fallback_used, fallback_message = run_policy_search(
                 db_b,
                 state=selected_state,
                 payer=selected_payer if selected_payer != 'All Payers' else None,
-                drug_class=selected_drug
+                drug_class=selected_drug,
+                headache_type=headache_type
             )
             
-            # Filter by headache type
-            if headache_type == "Cluster Headache":
-                query = query[query['Drug_Class'].str.contains('Cluster', case=False, na=False)]
-            elif headache_type == "Chronic Migraine":
-                query = query[query['Medication_Category'].str.contains('Chronic|Preventive', case=False, na=False)]
-            
             st.session_state.search_results = query
+            st.session_state.results_page = 0
             st.session_state.patient_age = patient_age
             st.session_state.matched_payer = selected_payer if selected_payer != 'All Payers' else None
             st.session_state.fallback_used = fallback_used
             st.session_state.fallback_message = fallback_message
-            st.session_state.botox_warning_shown = botox_warning_shown if 'botox_warning_shown' in dir() else False
+            st.session_state.botox_warning_shown = botox_warning_shown
             st.session_state.show_pa_text = False
         
         results = st.session_state.search_results
-        patient_age_display = st.session_state.get('patient_age', patient_age if 'patient_age' in dir() else 35)
+        patient_age_display = st.session_state.get('patient_age', 35)
         
         # Show fallback notice if applicable
         if st.session_state.get('fallback_used', False):
@@ -4498,9 +4835,14 @@ Step Therapy: REQUIRED ({step_req}, {step_dur})
                 )
                 results = results.sort_values('_payer_match').drop(columns=['_payer_match'])
             
-            for idx, row in results.iterrows():
-                # Build policy card with container
-                st.markdown(f"""
+            # Render a bounded number of cards; "Show more" extends the list
+            visible_count = (st.session_state.results_page + 1) * RESULTS_PAGE_SIZE
+            page_rows = results.iloc[:visible_count]
+            
+            # Plain dict records: no per-row Series construction, and .get() still works
+            for idx, row in zip(page_rows.index, page_rows.to_dict('records')):
+                # Collect the card's static HTML and emit it in one markdown call
+                card_html = [f"""
                 <div class="policy-card">
                     <div class="policy-header">
                         <div>
@@ -4509,28 +4851,30 @@ Step Therapy: REQUIRED ({step_req}, {step_dur})
                         </div>
                     </div>
                 </div>
-                """, unsafe_allow_html=True)
+                """]
                 
                 # ── Formulary Tier Map Section (v3.0) ──
                 vault_id = row.get('Vault_Payer_ID', '')
                 drug_cls = row.get('Drug_Class', '')
-                if vault_id and drug_cls and not formulary_tier_map.empty:
-                    tier_data = lookup_formulary_for_policy(formulary_tier_map, vault_id, drug_cls)
+                if vault_id and drug_cls and vault_db.formulary_by_payer_id:
+                    tier_data = lookup_formulary_for_policy(vault_db.formulary_by_payer_id, vault_id, drug_cls)
                     if not tier_data.empty:
                         # Determine selected drug from parsed note or sidebar
                         selected_drug = extract_selected_drug_name(st.session_state.get('patient_context', {}) or {})
-                        st.markdown(f'''<div class="policy-section"><div class="policy-section-title">💊 Formulary Coverage</div>
+                        card_html.append(f'''<div class="policy-section"><div class="policy-section-title">💊 Formulary Coverage</div>
 {build_formulary_html_table(tier_data, selected_drug)}
 {get_confidence_disclaimer(tier_data)}
 {get_preferred_drug_suggestion(tier_data, selected_drug)}
-</div>''', unsafe_allow_html=True)
+</div>''')
                 
                 # Step Therapy Section - use native Streamlit
                 if row['Step_Therapy_Required'] == 'Yes':
-                    st.markdown('<div class="policy-section"><div class="policy-section-title">Step Therapy Required</div>', unsafe_allow_html=True)
-                    
-                    step_req, step_dur = get_step_therapy_details(row); step_therapies = step_req.split(';')
-                    durations = step_dur.split(';')
+                    step_req, step_dur = get_step_therapy_details(row)
+                    step_therapies = row['Step_Therapies']
+                    durations = row['Step_Durations']
+                    n_steps = len(step_therapies)
+                    if len(durations) != n_steps:
+                        durations = ['Trial required'] * n_steps
                     
                     # Check if details are missing
                     has_missing_info = (
@@ -4538,16 +4882,16 @@ Step Therapy: REQUIRED ({step_req}, {step_dur})
                         'Trial duration not specified' in step_dur
                     )
                     
-                    for i, (therapy, duration) in enumerate(zip(step_therapies, durations if len(durations) == len(step_therapies) else ['Trial required'] * len(step_therapies)), 1):
-                        st.markdown(f"""
-                        <div class="step-item">
-                            <div class="step-number">{i}</div>
-                            <div>
-                                <strong style="color: #262730;">{therapy.strip()}</strong><br>
-                                <small style="color: #708090;">{duration.strip()}</small>
-                            </div>
-                        </div>
-                        """, unsafe_allow_html=True)
+                    # Step items go into the card markdown so the whole card renders in one call
+                    items_html = ''.join(
+                        f'<div class="step-item"><div class="step-number">{i}</div><div>'
+                        f'<strong style="color: #262730;">{therapy.strip()}</strong><br>'
+                        f'<small style="color: #708090;">{duration.strip()}</small></div></div>'
+                        for i, (therapy, duration) in enumerate(zip(step_therapies, durations), 1)
+                    )
+                    card_html.append(f'<div class="policy-section"><div class="policy-section-title">Step Therapy Required</div>{items_html}</div>')
+                    # Parts are stripped and newline-joined so no blank line ends the HTML block
+                    st.markdown("\n".join(part.strip() for part in card_html), unsafe_allow_html=True)
                     
                     # Add guidance if details are missing (always show)
                     if has_missing_info:
@@ -4618,7 +4962,7 @@ Step Therapy: REQUIRED ({step_req}, {step_dur})
                             prior_meds, 
                             diagnosis,
                             parsed_data=st.session_state.get('parsed_data'),
-                            policy_row=row.to_dict() if hasattr(row, 'to_dict') else row
+                            policy_row=row
                         )
                         
                         if criteria_results:
@@ -4742,21 +5086,19 @@ Step Therapy: REQUIRED ({step_req}, {step_dur})
                                           current=met_count, 
                                           required=total_required,
                                           missing=", ".join(missing_classes) if missing_classes else "additional medication trials")
-                    
-                    st.markdown("</div>", unsafe_allow_html=True)
                 else:
-                    st.markdown("""
+                    card_html.append("""
                     <div class="policy-section">
                         <div style="background: #F0FFF4; padding: 1rem; border-radius: 8px; border-left: 4px solid #10B981;">
                             <strong style="color: #10B981;">✅ No Step Therapy Required</strong><br>
                             <small style="color: #666;">This medication can be prescribed without prior trials</small>
                         </div>
                     </div>
-                    """, unsafe_allow_html=True)
+                    """)
                     
                     # PCP MODE: Explain what "no step therapy" means
                     if st.session_state.user_mode == 'pcp':
-                        st.markdown("""
+                        card_html.append("""
                         <div class="pro-tip">
                             <div class="pro-tip-title">💡 What this means for you</div>
                             <div class="pro-tip-content">
@@ -4764,7 +5106,9 @@ Step Therapy: REQUIRED ({step_req}, {step_dur})
                                 However, you still need to document medical necessity (diagnosis, severity, functional impact).
                             </div>
                         </div>
-                        """, unsafe_allow_html=True)
+                        """)
+                    
+                    st.markdown("\n".join(part.strip() for part in card_html), unsafe_allow_html=True)
                 
                 # Gold Card Status
                 if pd.notna(row.get('Gold_Card_Available')) and row['Gold_Card_Available'] == 'Yes':
@@ -4799,7 +5143,7 @@ Step Therapy: REQUIRED ({step_req}, {step_dur})
                         # Render gap analysis UI
                         with st.expander("📋 Complete Step Therapy Documentation", expanded=True):
                             ready_for_pa, updated_trials = render_gap_analysis_ui(
-                                policy_row=row.to_dict(),
+                                policy_row=row,
                                 medication_trials=medication_trials,
                                 unique_key=f"gap_{idx}"
                             )
@@ -4876,6 +5220,12 @@ Step Therapy: REQUIRED ({step_req}, {step_dur})
                         st.caption("Fill in missing medication details to enable PA generation")
                 
                 st.markdown("<br>", unsafe_allow_html=True)
+            
+            remaining = len(results) - visible_count
+            if remaining > 0:
+                if st.button(f"Show more ({remaining} remaining)", key="show_more_results", use_container_width=True):
+                    st.session_state.results_page += 1
+                    st.rerun()
 
 # ============================================================================
 # AI PARSER PAGE
@@ -4917,42 +5267,55 @@ Patient is interested in trying Aimovig (erenumab) for migraine prevention."""
             st.session_state.parsed_data = None
             st.session_state.data_collection_state = None
             
-            with st.spinner("🧠 Analyzing clinical note..."):
-                parsed_data = parse_clinical_note(clinical_note, db_a, db_b)
-                
+            # Re-parsing the same note reuses the previous extraction (no spinner, no API call)
+            note_hash = hash(clinical_note)
+            last_parse = st.session_state.get('_last_parse')
+            if last_parse and last_parse[0] == note_hash:
+                parsed_data = dict(last_parse[1])
+                parse_seconds = 0.0
+            else:
+                with st.spinner("🧠 Analyzing clinical note..."):
+                    parse_start = time.perf_counter()
+                    parsed_data = parse_clinical_note(clinical_note, db_a, db_b)
+                    parse_seconds = time.perf_counter() - parse_start
                 if parsed_data:
-                    # CRITICAL: Store raw clinical note text in parsed_data
-                    # so check_criteria_met() can search it for bypass conditions
-                    # (CV contraindications, pregnancy, serotonin syndrome, etc.)
-                    parsed_data['clinical_note'] = clinical_note
-                    
-                    # Update unified patient context
-                    SessionStateManager.set_from_ai_parse(parsed_data)
-                    st.session_state.parsed_data = parsed_data  # Keep for backward compatibility
-                    
-                     # Create and store DataCollectionState for quality tracking
-                    try:
-                        collection_state = analyze_parsed_data(parsed_data)
-                        st.session_state.data_collection_state = collection_state
-                    except Exception as e:
-                        # Fallback if parsing fails
-                        collection_state = DataCollectionState()
-                        st.session_state.data_collection_state = collection_state
-                    
-                    # Success celebration
+                    st.session_state._last_parse = (note_hash, dict(parsed_data))
+                
+            if parsed_data:
+                # CRITICAL: Store raw clinical note text in parsed_data
+                # so check_criteria_met() can search it for bypass conditions
+                # (CV contraindications, pregnancy, serotonin syndrome, etc.)
+                parsed_data['clinical_note'] = clinical_note
+                
+                # Update unified patient context
+                SessionStateManager.set_from_ai_parse(parsed_data)
+                st.session_state.parsed_data = parsed_data  # Keep for backward compatibility
+                
+                 # Create and store DataCollectionState for quality tracking
+                try:
+                    collection_state = analyze_parsed_data(parsed_data)
+                    st.session_state.data_collection_state = collection_state
+                except Exception as e:
+                    # Fallback if parsing fails
+                    collection_state = DataCollectionState()
+                    st.session_state.data_collection_state = collection_state
+                
+                # Success celebration - balloons only on the first parse of the session
+                if not st.session_state.get('_parsed_once'):
                     st.balloons()
-                    st.success("🎉 **Note Parsed Successfully!** Extracted patient data.")
-                    
-                    # Show quality indicator
-                    if collection_state and hasattr(collection_state, 'get_search_quality_score'):
-                        score, desc = collection_state.get_search_quality_score()
-                        st.markdown(get_quality_indicator_html(score, desc), unsafe_allow_html=True)
-                    else:
-                        st.info("📊 Data extracted - proceed to Search to find policies.")
-                    
-                    # Show warning if state is missing
-                    if collection_state and hasattr(collection_state, 'state') and not collection_state.state:
-                        st.markdown("""
+                    st.session_state._parsed_once = True
+                st.success(f"🎉 **Note Parsed Successfully!** Extracted patient data in {parse_seconds:.2f}s.")
+                
+                # Show quality indicator
+                if collection_state and hasattr(collection_state, 'get_search_quality_score'):
+                    score, desc = collection_state.get_search_quality_score()
+                    st.markdown(get_quality_indicator_html(score, desc), unsafe_allow_html=True)
+                else:
+                    st.info("📊 Data extracted - proceed to Search to find policies.")
+                
+                # Show warning if state is missing
+                if collection_state and hasattr(collection_state, 'state') and not collection_state.state:
+                    st.markdown("""
 <div class="required-field-box">
     <div style="font-weight: 700; color: #DC2626; margin-bottom: 0.5rem;">
         🔴 State Not Detected
@@ -4962,9 +5325,9 @@ Patient is interested in trying Aimovig (erenumab) for migraine prevention."""
     </div>
 </div>
 """, unsafe_allow_html=True)
-                    
-                    # Auto-scroll to results
-                    # Scroll handled by anchor below
+                
+                # Auto-scroll to results
+                # Scroll handled by anchor below
     
     # Display parsed data if available
     if 'parsed_data' in st.session_state:
@@ -5105,48 +5468,50 @@ Patient is interested in trying Aimovig (erenumab) for migraine prevention."""
                 if unmatched:
                     st.warning(f"⚠️ Could not match: {', '.join(unmatched)}")
             else:
-                # Fallback to simple list if no matches
+                # Fallback to simple list if no matches, emitted as one markdown list
+                med_lines = []
                 for med in prior_meds:
                     if isinstance(med, str):
-                        st.markdown(f"- {med}")
+                        med_lines.append(f"- {med}")
                     elif isinstance(med, dict):
                         name = med.get('name', 'Unknown')
                         dose = med.get('dose', '')
                         dur = med.get('duration_weeks', '')
                         reason = med.get('reason_stopped', '')
                         details = [d for d in [dose, f"{dur} weeks" if dur else '', reason] if d]
-                        st.markdown(f"- {name}" + (f" | {' | '.join(details)}" if details else ""))
+                        med_lines.append(f"- {name}" + (f" | {' | '.join(details)}" if details else ""))
+                if med_lines:
+                    st.markdown("\n".join(med_lines))
         
         # Edit mode
         with st.expander("✏️ Edit Extracted Data", expanded=False):
             st.markdown("Review and modify the extracted information before searching:")
             
             # Handle state - if AI returned None, show warning and default to first state
-            state_options = sorted(db_b['State'].unique().tolist())
-            if parsed.get('state') and parsed.get('state') in state_options:
-                state_index = state_options.index(parsed['state'])
-            else:
-                state_index = 0  # Default to first alphabetically (AL or ALL)
-                if not parsed.get('state'):
-                    show_error("state_required")
+            state_options = states_sorted()
+            # Default to first alphabetically (AL or ALL) if the state is missing or unknown
+            state_option_idx = state_to_idx().get(parsed.get('state'), 0)
+            if not parsed.get('state'):
+                show_error("state_required")
             
-            edited_state = st.selectbox("State", options=state_options, index=state_index)
+            edited_state = st.selectbox("State", options=state_options, index=state_option_idx)
             
-            # Filter payers by edited state
-            state_payers = sorted(db_b[db_b['State'] == edited_state]['Payer_Name'].unique().tolist())
+            # Filter payers by edited state (cached per state, shared with the Search sidebar)
+            payer_options_edit = ['All Payers'] + payers_for_state(edited_state)
             
-            # Try to match payer
+            # Try to match payer (offset by 1 for the 'All Payers' option)
             payer_index = 0
             if parsed.get('payer'):
-                for i, p in enumerate(state_payers):
-                    if parsed['payer'].lower() in p.lower() or p.lower() in parsed['payer'].lower():
-                        payer_index = i
-                        break
+                parsed_payer = parsed['payer'].lower()
+                payer_index = next(
+                    (i for i, p in enumerate(lower_payers_for_state(edited_state), 1) if parsed_payer in p or p in parsed_payer),
+                    0
+                )
             
-            edited_payer = st.selectbox("Payer", options=['All Payers'] + state_payers, index=payer_index)
+            edited_payer = st.selectbox("Payer", options=payer_options_edit, index=payer_index)
             
             # Filter drugs by edited state
-            state_drugs = sorted(db_b[db_b['State'] == edited_state]['Drug_Class'].unique().tolist())
+            state_drugs = drug_classes_for_state(edited_state)
             drug_index = 0
             parsed_drug = parsed.get('drug_class')
             
@@ -5216,35 +5581,28 @@ Patient is interested in trying Aimovig (erenumab) for migraine prevention."""
                 
                 # Handle cluster headache drug class fallback
                 if search_drug_class and 'Cluster' in search_drug_class:
-                    state_drugs = db_b[db_b['State'] == parsed.get('state')]['Drug_Class'].unique().tolist()
+                    state_drugs = drug_classes_for_state(parsed['state']) if parsed['state'] in states_set() else []
                     if search_drug_class not in state_drugs and 'CGRP mAbs (SC)' in state_drugs:
                         search_drug_class = 'CGRP mAbs (SC)'  # Fall back to CGRP mAbs (SC) for cluster
                 
+                # Filter by diagnosis - but DON'T double-filter if drug_class already contains the diagnosis,
+                # and keep the unfiltered results if the filter would empty them. Don't filter episodic - too aggressive
+                diagnosis_filter = parsed.get('diagnosis')
+                if diagnosis_filter == "Cluster Headache" and not (parsed.get('drug_class') and 'Cluster' not in parsed['drug_class']):
+                    diagnosis_filter = None
+                
                 # Perform search with national fallback support
-                query, fallback_used, fallback_message = search_policies_with_fallback(
+                query, fallback_used, fallback_message = run_policy_search(
                     db_b,
                     state=parsed.get('state'),
                     payer=parsed.get('payer'),
-                    drug_class=search_drug_class
+                    drug_class=search_drug_class,
+                    headache_type=diagnosis_filter,
+                    keep_if_empty=True
                 )
                 
-                # Filter by diagnosis - but DON'T double-filter if drug_class already contains the diagnosis
-                if parsed.get('diagnosis') == "Cluster Headache":
-                    # Only apply cluster filter if we actually have cluster-specific policies
-                    if parsed.get('drug_class') and 'Cluster' not in parsed.get('drug_class', ''):
-                        cluster_filtered = query[query['Drug_Class'].str.contains('Cluster', case=False, na=False)]
-                        # Only use cluster filter if it returns results, otherwise keep CGRP mAbs
-                        if not cluster_filtered.empty:
-                            query = cluster_filtered
-                elif parsed.get('diagnosis') == "Chronic Migraine":
-                    # Only filter if needed
-                    if not query.empty:
-                        chronic_filtered = query[query['Medication_Category'].str.contains('Chronic|Preventive', case=False, na=False)]
-                        if not chronic_filtered.empty:
-                            query = chronic_filtered
-                # Don't filter episodic - too aggressive
-                
                 st.session_state.search_results = query
+                st.session_state.results_page = 0
                 st.session_state.patient_age = parsed.get('age') if parsed.get('age') else None  # Don't default to 35
                 st.session_state.matched_payer = parsed.get('payer')
                 st.session_state.fallback_used = fallback_used
@@ -5298,11 +5656,11 @@ if st.session_state.current_page == 'Search' and st.session_state.search_results
                 # Show ICD-10 codes inline
                 headache_type_val = st.session_state.get('headache_type', 'Chronic Migraine')
                 if headache_type_val == "Cluster Headache":
-                    icd_filter = icd10[icd10['ICD10_Code'].str.startswith('G44.0')]
+                    icd_filter = icd10[icd10['Is_Cluster']]
                 elif headache_type_val == "Chronic Migraine":
-                    icd_filter = icd10[icd10['ICD10_Code'].str.contains('G43.7', regex=False)]
+                    icd_filter = icd10[icd10['Is_Chronic_Migraine']]
                 else:
-                    icd_filter = icd10[icd10['ICD10_Code'].str.startswith('G43')]
+                    icd_filter = icd10[icd10['Is_Migraine']]
                 
                 st.dataframe(
                     icd_filter[['ICD10_Code', 'ICD10_Description', 'PA_Relevance']],
@@ -5313,96 +5671,53 @@ if st.session_state.current_page == 'Search' and st.session_state.search_results
 # ============================================================================
 # MOH CHECKER (Only on Search page)
 # ============================================================================
-if st.session_state.current_page == 'Search' and st.session_state.show_moh_check:
+ss = st.session_state
+if ss.current_page == 'Search' and ss.show_moh_check:
     st.markdown("---")
     st.markdown("### ⚕️ Medication Overuse Headache (MOH) Screening")
     
     st.info("Track OTC medication use to identify patients at risk for medication overuse headache (ICHD-3 Section 8.2)")
     
-    # Simple MOH calculator
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("**Simple Analgesics** (Threshold: ≥15 days/month)")
-        simple_days = st.number_input(
-            "Days per month using acetaminophen, ibuprofen, naproxen, or aspirin",
-            min_value=0,
-            max_value=31,
-            value=0
-        )
-    
-    with col2:
-        st.markdown("**Combination Analgesics** (Threshold: ≥10 days/month)")
-        combo_days = st.number_input(
-            "Days per month using Excedrin, BC Powder, or caffeine-containing products",
-            min_value=0,
-            max_value=31,
-            value=0
-        )
+    # Simple MOH calculator - batched in a form so typing doesn't rerun the page
+    with st.form("moh_form"):
+        col1, col2 = st.columns([1, 1], gap="small")
+        
+        with col1:
+            st.markdown(f"**Simple Analgesics** (Threshold: ≥{_MOH_SIMPLE_THRESH} days/month)")
+            simple_days = st.number_input(
+                "Days per month using acetaminophen, ibuprofen, naproxen, or aspirin",
+                min_value=0,
+                max_value=31,
+                value=0
+            )
+        
+        with col2:
+            st.markdown(f"**Combination Analgesics** (Threshold: ≥{_MOH_COMBO_THRESH} days/month)")
+            combo_days = st.number_input(
+                "Days per month using Excedrin, BC Powder, or caffeine-containing products",
+                min_value=0,
+                max_value=31,
+                value=0
+            )
+        
+        submitted = st.form_submit_button("Screen for MOH")
     
     # Display MOH risk
-    if simple_days >= 15 or combo_days >= 10:
-        st.markdown('<div class="warning-box">⚠️ <strong>MOH RISK IDENTIFIED</strong><br>' +
-                  'Patient meets ICHD-3 criteria for medication overuse. Consider:<br>' +
-                  '• ICD-10 Code: G44.41 (Drug-induced headache, NEC)<br>' +
-                  '• CGRP therapy (lower MOH risk per AHS 2021)<br>' +
-                  '• Medication withdrawal protocol</div>',
-                  unsafe_allow_html=True)
-    else:
-        st.markdown('<div class="success-box">✅ No medication overuse detected based on current usage pattern</div>',
-                  unsafe_allow_html=True)
+    if submitted:
+        moh_risk = moh_flags(np.array([simple_days]), np.array([combo_days]))[0]
+        if moh_risk:
+            st.warning(_MOH_WARN_MD, icon="⚠️")
+        else:
+            st.success(_MOH_OK_MD, icon="✅")
     
-    # Show OTC medication reference
-    with st.expander("📚 OTC Medication Reference"):
+    # Show OTC medication reference - only serialized once the user asks for it
+    if st.checkbox("📚 Show OTC Medication Reference", key="_moh_ref_open"):
         st.dataframe(
-            otc[['Medication_Name', 'MOH_Category', 'MOH_Threshold_Days_Per_Month', 'Caffeine_Content_mg']],
+            _OTC_MOH_VIEW,
             use_container_width=True,
             hide_index=True
         )
 
 # Production Footer with HIPAA Disclaimer
 st.markdown("---")
-st.markdown("""
-<div style="background: #FEF2F2; border: 1px solid #FECACA; border-radius: 8px; padding: 16px; margin-bottom: 1.5rem;">
-    <div style="font-weight: 700; color: #991B1B; margin-bottom: 8px; font-size: 0.9rem;">
-        ⚖️ Legal Disclaimer — Please Read
-    </div>
-    <div style="font-size: 0.8rem; color: #7F1D1D; line-height: 1.5;">
-        <strong>NOT HIPAA COMPLIANT:</strong> The Headache Vault Demo is a prototype for demonstration and 
-        educational purposes only. This application uses external AI services (Anthropic Claude API) and 
-        cloud hosting (Streamlit) that have NOT been configured for HIPAA compliance. Do not enter Protected 
-        Health Information (PHI) including patient names, DOB, MRN, SSN, specific dates of service, or contact information.
-        <br><br>
-        <strong>NOT MEDICAL/LEGAL ADVICE:</strong> Information provided is for educational purposes only and does not 
-        constitute medical, legal, or billing advice. Always verify payer requirements directly.
-        <br><br>
-        <strong>PRODUCTION VERSION:</strong> A HIPAA-compliant version with BAA coverage is planned for August 2026. 
-        Contact info@headachevault.com for enterprise inquiries.
-    </div>
-</div>
-
-<div class="production-footer">
-    <div style="margin-bottom: 1rem;">
-        <span class="footer-badge">📊 CMS Data Sources</span>
-        <span class="footer-badge">🏥 State DOI Verified</span>
-        <span class="footer-badge" style="background: #FEF3C7; color: #92400E;">⚠️ Demo Only</span>
-    </div>
-    <div style="font-size: 0.9rem; color: #262730; margin-bottom: 1rem;">
-        <strong style='color: #4B0082; font-size: 1.1rem;'>The Headache Vault PA Engine</strong><br>
-        <span style='color: #5A5A5A;'>Demo v1.0 | February 2026</span>
-    </div>
-    <div style="font-size: 0.85rem; color: #5A5A5A; margin-bottom: 1rem;">
-        Infrastructure to Scale Specialist-Level Care<br>
-        <strong>752 payer policies</strong> • <strong>50 states</strong> • <strong>1,088 payers</strong><br>
-        Coverage expanding weekly
-    </div>
-    <div style="font-size: 0.8rem; color: #708090;">
-        Clinical logic based on <strong>AHS 2021/2024</strong>, <strong>ACP 2025</strong>, <strong>ICHD-3 Criteria</strong><br>
-        🤖 Powered by <strong>Anthropic Claude AI</strong> | ⚡ Average response time: <strong>&lt;2 seconds</strong>
-    </div>
-    <div style="margin-top: 1rem; font-size: 0.75rem; color: #999;">
-        📅 Last Updated: January 15, 2026 | 🔄 Database refreshed daily<br>
-        <span style="color: #DC2626;">⚠️ NOT FOR CLINICAL USE — DEMONSTRATION ONLY</span>
-    </div>
-</div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+st.html(_FOOTER_HTML)
\ No newline at end of file